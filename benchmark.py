@@ -0,0 +1,70 @@
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+
+import cv2
+
+from play.common import Logger, LogLevel
+from play.data import Encoder, Encoding
+
+
+LOGS: list[str] = ['debug', 'error', 'info', 'warning']
+SUFFIXES: tuple[str, ...] = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+
+
+def get_args() -> Namespace:
+    parser: ArgumentParser = ArgumentParser(description='Image encoder benchmark')
+    parser.add_argument('--input', help='An image or a directory of images to encode.', required=True, type=str)
+    parser.add_argument('--formats', default=['.jpg', '.png', '.webp'], help='The formats to encode to.', nargs='+', type=str)
+    parser.add_argument('--qualities', default=[75, 90, 95], help='The jpeg and webp qualities to compare.', nargs='+', type=int)
+    parser.add_argument('--compressions', default=[1, 3, 9], help='The png compression levels to compare.', nargs='+', type=int)
+    parser.add_argument('--limit', default=100, help='The maximum number of images to load.', type=int)
+    parser.add_argument('--workers', default=4, help='The number of encoding threads.', type=int)
+
+    parser.add_argument('--log-level', default='info', choices=LOGS)
+
+    return parser.parse_args()
+
+def get_settings(args: Namespace) -> dict[str, Encoding]:
+    settings: dict[str, Encoding] = {}
+    for format in args.formats:
+        suffix = format if format.startswith('.') else f'.{format}'
+        if suffix == '.png':
+            for compression in args.compressions:
+                settings[f'png compression={compression}'] = Encoding(compression=compression, format=suffix)
+        elif suffix in ('.jpg', '.jpeg', '.webp'):
+            for quality in args.qualities:
+                settings[f'{suffix[1:]} quality={quality}'] = Encoding(format=suffix, quality=quality)
+                if suffix != '.webp':
+                    name = f'{suffix[1:]} quality={quality} optimize progressive'
+                    settings[name] = Encoding(format=suffix, optimize=True, progressive=True, quality=quality)
+        else:
+            settings[suffix[1:]] = Encoding(format=suffix)
+    return settings
+
+def main() -> int:
+    args = get_args()
+    logger = Logger(log_level=LogLevel.from_str(args.log_level), prefix='benchmark', section='main')
+
+    path = Path(args.input)
+    paths = [path] if path.is_file() else sorted(p for p in path.rglob('*') if p.suffix.lower() in SUFFIXES)
+    arrays = [array for array in (cv2.imread(p, cv2.IMREAD_COLOR) for p in paths[:args.limit]) if array is not None]
+    if not arrays:
+        logger.error(f'No images found in {path}')
+        return 1
+
+    pixels = sum(array.nbytes for array in arrays)
+    logger.info(f'Encoding {len(arrays)} images ({pixels} bytes of pixels)', workers=args.workers)
+    for result in Encoder.benchmark(arrays, get_settings(args), args.workers):
+        ratio = round(pixels / result['bytes'], 2) if result['bytes'] else 0.0
+        logger.info(
+            f'{result["name"]}: {result["seconds"]}s, {result["images_per_second"]} images/s, '
+            f'{result["bytes"]} bytes, ratio {ratio}',
+            ratio=ratio,
+            **result,
+        )
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
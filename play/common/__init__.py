@@ -2,7 +2,8 @@ from .config import Config
 from .context import Context
 from .logger import Logger, LogLevel
 from .metrics import Metrics
+from .pipeline import Pipeline, Stage, StageError
 from .task import TaskType
 
 
-__all__ = ('Config', 'Context', 'Logger', 'LogLevel', 'Metrics', 'TaskType')
\ No newline at end of file
+__all__ = ('Config', 'Context', 'Logger', 'LogLevel', 'Metrics', 'Pipeline', 'Stage', 'StageError', 'TaskType')
\ No newline at end of file
@@ -0,0 +1,193 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Callable, Generator, Iterable
+
+from .logger import Logger
+
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    '''A pipeline step: `fn` runs on `workers` threads, or on a pool of `workers` processes when mode is "process".'''
+    name: str
+    fn: Callable[[Any], Any]
+
+    mode: str = 'thread'
+    queue_size: int = 8
+    workers: int = 1
+
+@dataclass
+class StageError:
+    '''Failure marker forwarded through the remaining stages in place of the item.'''
+    stage: str
+    item: Any
+    error: Exception
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+
+    busy: float = 0.0
+    failures: int = 0
+    items: int = 0
+    lock: Lock = field(default_factory=Lock, repr=False)
+
+    def add(self, elapsed: float, failed: bool = False) -> None:
+        with self.lock:
+            self.busy += elapsed
+            self.items += 1
+            if failed:
+                self.failures += 1
+
+    def utilisation(self, elapsed: float) -> float:
+        '''Fraction of the stage worker time spent running the stage function.'''
+        if elapsed <= 0:
+            return 0.0
+        return min(self.busy / (self.workers * elapsed), 1.0)
+
+class Pipeline:
+    '''
+    Runs items through stages that overlap in time. Each stage consumes a bounded queue
+    and feeds the next one, so a slow stage applies backpressure to the ones before it.
+    Results are yielded in completion order.
+    '''
+    def __init__(self, stages: list[Stage], logger: Logger | None = None) -> None:
+        self.logger = logger
+        self.stages = stages
+        self.stats = [StageStats(name=stage.name, workers=stage.workers) for stage in stages]
+        self.elapsed: float = 0.0
+        self._closed = Event()
+
+    def _feed(self, source: Iterable, queue: Queue) -> None:
+        try:
+            for item in source:
+                if not self._put(queue, item):
+                    return
+        except Exception as e:
+            if self.logger:
+                self.logger.exception(f'Pipeline source failed: {e}')
+        self._put(queue, _STOP)
+
+    def _get(self, queue: Queue) -> Any:
+        while not self._closed.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                continue
+        return _STOP
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        while not self._closed.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _work(
+        self,
+        index: int,
+        inbox: Queue,
+        outbox: Queue,
+        pool: ProcessPoolExecutor | None,
+        remaining: list[int],
+        lock: Lock,
+    ) -> None:
+        stage = self.stages[index]
+        stats = self.stats[index]
+        while True:
+            item = self._get(inbox)
+            if item is _STOP:
+                self._put(inbox, _STOP)  # let sibling workers see it
+                break
+
+            if isinstance(item, StageError):
+                self._put(outbox, item)
+                continue
+
+            start = perf_counter()
+            try:
+                if pool:
+                    result = pool.submit(stage.fn, item).result()
+                else:
+                    result = stage.fn(item)
+                stats.add(perf_counter() - start)
+            except Exception as e:
+                stats.add(perf_counter() - start, failed=True)
+                if self.logger:
+                    self.logger.error(f'Stage "{stage.name}" failed: {type(e).__name__}: {e}')
+                result = StageError(stage=stage.name, item=item, error=e)
+
+            if not self._put(outbox, result):
+                break
+
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._put(outbox, _STOP)
+
+    def report(self) -> None:
+        '''Log per-stage throughput and utilisation; the most utilised stage is the bottleneck.'''
+        if not self.logger:
+            return
+
+        for stats in self.stats:
+            self.logger.info(
+                f'Stage "{stats.name}" processed {stats.items} items ({stats.failures} failed), '
+                f'utilisation {stats.utilisation(self.elapsed):.0%}',
+                workers=stats.workers,
+                busy=round(stats.busy, 3),
+            )
+
+        if self.stats:
+            bottleneck = max(self.stats, key=lambda s: s.utilisation(self.elapsed))
+            self.logger.info(f'Pipeline bottleneck stage: {bottleneck.name}', elapsed=round(self.elapsed, 3))
+
+    def run(self, source: Iterable) -> Generator[Any, None, None]:
+        self._closed.clear()
+        sizes = [stage.queue_size for stage in self.stages]
+        queues = [Queue(maxsize=max(size, 1)) for size in sizes + sizes[-1:]]
+        pools: list[ProcessPoolExecutor] = []
+        threads: list[Thread] = [Thread(target=self._feed, args=(source, queues[0]), daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            pool = None
+            if stage.mode == 'process':
+                pool = ProcessPoolExecutor(max_workers=stage.workers)
+                pools.append(pool)
+            elif stage.mode != 'thread':
+                raise ValueError(f'Unknown stage mode: {stage.mode}')
+
+            remaining, lock = [stage.workers], Lock()
+            for _ in range(stage.workers):
+                threads.append(Thread(
+                    target=self._work,
+                    args=(index, queues[index], queues[index + 1], pool, remaining, lock),
+                    daemon=True,
+                ))
+
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _STOP:
+                    break
+                yield item
+        finally:
+            self._closed.set()
+            for thread in threads:
+                thread.join()
+            for pool in pools:
+                pool.shutdown(cancel_futures=True)
+            self.elapsed = perf_counter() - start
@@ -1,8 +1,8 @@
-from .components import Annotation, Annotations, Component, Bbox, Points2D, Image, Text
+from .components import Annotation, Annotations, Component, Bbox, Encoding, Points2D, Image, Text
 from .data import Data
 from .ingestors import Ingestor, IngestorFactory
 from .processor import Job, ProcessFactory, Processor
-from .utils import Downloader, ImageUtils, Storage, StorageFactory
+from .utils import Downloader, Encoder, ImageUtils, LabelCache, LocalStorage, Manifest, PackedStorage, ShardStorage, SQLiteStorage, Storage, StorageFactory, WriteBehind
 
 
-__all__ = ('Annotation', 'Annotations', 'Bbox', 'Component', 'Data', 'Downloader', 'Image', 'ImageUtils', 'Ingestor', 'IngestorFactory', 'Job', 'Points2D', 'Processor', 'ProcessFactory', 'Storage', 'StorageFactory', 'Text')
+__all__ = ('Annotation', 'Annotations', 'Bbox', 'Component', 'Data', 'Downloader', 'Encoder', 'Encoding', 'Image', 'ImageUtils', 'Ingestor', 'IngestorFactory', 'Job', 'LabelCache', 'LocalStorage', 'Manifest', 'PackedStorage', 'Points2D', 'Processor', 'ProcessFactory', 'ShardStorage', 'SQLiteStorage', 'Storage', 'StorageFactory', 'Text', 'WriteBehind')
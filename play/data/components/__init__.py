@@ -1,5 +1,5 @@
 from .annotation import Annotation, Annotations
 from .component import Component
 from .geometry import Bbox, Points2D
-from .image import Image
+from .image import Encoding, Image
 from .text import Text
\ No newline at end of file
@@ -1,4 +1,7 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
 
 from .geometry import Bbox, Points2D
 from .component import Component
@@ -12,94 +15,340 @@ class Annotation:
     confidence: float | None = None
     points: Points2D | None = None
 
-@dataclass
+class AnnotationView:
+    '''
+    Per-item access into the arrays of an Annotations. Geometry is read as a new Bbox or
+    Points2D, so changes to it must be assigned back to be kept.
+    '''
+    __slots__ = ('_index', '_owner')
+
+    def __init__(self, owner: 'Annotations', index: int) -> None:
+        self._index = index
+        self._owner = owner
+
+    def __repr__(self) -> str:
+        return (
+            f'AnnotationView(class_id={self.class_id}, class_name={self.class_name}, '
+            f'confidence={self.confidence}, bbox={self.bbox}, points={self.points})'
+        )
+
+    @property
+    def bbox(self) -> Bbox | None:
+        row = self._owner.boxes[self._index]
+        if np.isnan(row[0]):
+            return None
+        orientation = self._owner.orientations[self._index]
+        return Bbox(coords=row.tolist(), orientation=None if np.isnan(orientation) else float(orientation))
+
+    @bbox.setter
+    def bbox(self, bbox: Bbox | None) -> None:
+        self._owner._own()
+        self._owner.boxes[self._index] = _box_row(bbox)
+        self._owner.orientations[self._index] = _orientation(bbox)
+
+    @property
+    def class_id(self) -> int | None:
+        class_id = int(self._owner.class_ids[self._index])
+        return None if class_id < 0 else class_id
+
+    @class_id.setter
+    def class_id(self, class_id: int | None) -> None:
+        self._owner._own()
+        self._owner.class_ids[self._index] = -1 if class_id is None else class_id
+
+    @property
+    def class_name(self) -> str | None:
+        return self._owner.class_names[self._index]
+
+    @class_name.setter
+    def class_name(self, class_name: str | None) -> None:
+        self._owner._own()
+        self._owner.class_names[self._index] = class_name
+
+    @property
+    def confidence(self) -> float | None:
+        confidence = float(self._owner.confidences[self._index])
+        return None if np.isnan(confidence) else confidence
+
+    @confidence.setter
+    def confidence(self, confidence: float | None) -> None:
+        self._owner._own()
+        self._owner.confidences[self._index] = np.nan if confidence is None else confidence
+
+    @property
+    def points(self) -> Points2D | None:
+        start, end = self._owner.offsets[self._index], self._owner.offsets[self._index + 1]
+        if start == end:
+            return None
+        return Points2D(coords=self._owner.points[start:end].tolist())
+
+    @points.setter
+    def points(self, points: Points2D | None) -> None:
+        owner = self._owner
+        start, end = owner.offsets[self._index], owner.offsets[self._index + 1]
+        coords = np.asarray(points.coords if points and points.coords else [], dtype=np.float64)
+
+        owner._own()
+        owner.points = np.concatenate([owner.points[:start], coords, owner.points[end:]])
+        owner.offsets[self._index + 1:] += len(coords) - (end - start)
+
 class Annotations(Component):
-    items: list[Annotation] = field(default_factory=lambda: [])
+    '''
+    Annotations stored as columns: class ids, confidences, an Nx4 box array and a ragged
+    point array indexed by offsets. Missing values are -1 for class ids and NaN otherwise.
+    Copies share the arrays until one of them is modified.
+    '''
+    def __init__(
+        self,
+        name: str,
+        parent: Path | None,
+        suffix: str,
+        items: list[Annotation] | None = None,
+        format: str = 'xywh',
+    ) -> None:
+        super().__init__(name=name, parent=parent, suffix=suffix)
+        self.format = format
+        self.shared = False
+        self.clean()
+        if items:
+            self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self.class_ids)
+
+    def __repr__(self) -> str:
+        return f'Annotations(name={self.name}, parent={self.parent}, suffix={self.suffix}, size={len(self)})'
+
+    def _own(self) -> None:
+        if not self.shared:
+            return
+
+        self.boxes = self.boxes.copy()
+        self.class_ids = self.class_ids.copy()
+        self.class_names = list(self.class_names)
+        self.confidences = self.confidences.copy()
+        self.offsets = self.offsets.copy()
+        self.orientations = self.orientations.copy()
+        self.points = self.points.copy()
+        self.shared = False
+
+    @property
+    def items(self) -> list[AnnotationView]:
+        return [AnnotationView(self, index) for index in range(len(self))]
 
     def add(self, anno: Annotation) -> None:
-        self.items.append(anno)
+        self.extend([anno])
+
+    def assign(
+        self,
+        class_ids: np.ndarray,
+        boxes: np.ndarray,
+        orientations: np.ndarray,
+        points: np.ndarray,
+        offsets: np.ndarray,
+    ) -> None:
+        '''Replace all items with the given columns. Arrays are used as they are, without copying.'''
+        self.boxes = boxes
+        self.class_ids = class_ids
+        self.class_names = [None] * len(class_ids)
+        self.confidences = np.full((len(class_ids),), np.nan)
+        self.offsets = offsets
+        self.orientations = orientations
+        self.points = points
+        self.shared = False
 
     def clean(self) -> None:
-        self.items.clear()
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+        self.class_ids = np.empty((0,), dtype=np.int64)
+        self.class_names: list[str | None] = []
+        self.confidences = np.empty((0,), dtype=np.float64)
+        self.offsets = np.zeros((1,), dtype=np.int64)
+        self.orientations = np.empty((0,), dtype=np.float64)
+        self.points = np.empty((0,), dtype=np.float64)
+        self.shared = False
 
     def copy(self) -> 'Annotations':
-        return Annotations(
-            items=self.items.copy(),
-            name=self.name,
-            parent=self.parent,
-            suffix=self.suffix,
-        )
-    
-    def delete(self, anno: Annotation) -> None:
-        self.items.remove(anno)
+        copy = Annotations(format=self.format, name=self.name, parent=self.parent, suffix=self.suffix)
+        copy.boxes = self.boxes
+        copy.class_ids = self.class_ids
+        copy.class_names = self.class_names
+        copy.confidences = self.confidences
+        copy.offsets = self.offsets
+        copy.orientations = self.orientations
+        copy.points = self.points
+        copy.shared = self.shared = True
+        return copy
+
+    def delete(self, anno: AnnotationView | int) -> None:
+        index = anno._index if isinstance(anno, AnnotationView) else anno
+        self.select(np.arange(len(self)) != index)
+
+    def denormalize(self, height: int | float, width: int | float) -> None:
+        '''Scale normalized boxes and points to pixels.'''
+        self._own()
+        self.boxes *= np.array([width, height, width, height])
+        self.points[0::2] *= width
+        self.points[1::2] *= height
+
+    def dumps(self) -> str:
+        '''YOLO label text of the items; points override the box, orientation follows the box.'''
+        lines: list[str] = []
+        has_box, has_points = self.has_box(), self.has_points()
+        for index, class_id in enumerate(self.class_ids.tolist()):
+            if class_id < 0:
+                continue
+
+            coords: list[float] = []
+            if has_points[index]:
+                coords = self.points[self.offsets[index]:self.offsets[index + 1]].tolist()
+            elif has_box[index]:
+                coords = self.boxes[index].tolist()
+                if not np.isnan(self.orientations[index]):
+                    coords.append(float(self.orientations[index]))
+
+            lines.append(f'{class_id} {' '.join(_format(n) for n in coords)}\n')
+        return ''.join(lines)
+
+    def extend(self, items: list[Annotation]) -> None:
+        coords = [np.asarray(a.points.coords if a.points and a.points.coords else [], dtype=np.float64) for a in items]
+        lengths = np.cumsum([len(c) for c in coords], dtype=np.int64)
+
+        self._own()
+        self.boxes = np.concatenate([self.boxes, np.array([_box_row(a.bbox) for a in items]).reshape(-1, 4)])
+        self.class_ids = np.concatenate([self.class_ids, np.array([-1 if a.class_id is None else a.class_id for a in items], dtype=np.int64)])
+        self.class_names = self.class_names + [a.class_name for a in items]
+        self.confidences = np.concatenate([self.confidences, np.array([np.nan if a.confidence is None else a.confidence for a in items], dtype=np.float64)])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + lengths])
+        self.orientations = np.concatenate([self.orientations, np.array([_orientation(a.bbox) for a in items], dtype=np.float64)])
+        self.points = np.concatenate([self.points, *coords])
+
+    def has_box(self) -> np.ndarray:
+        return ~np.isnan(self.boxes[:, 0])
+
+    def has_points(self) -> np.ndarray:
+        return np.diff(self.offsets) > 0
 
     def is_empty(self) -> bool:
-        return len(self.items) <= 0 
-    
+        return len(self) <= 0
+
     def load(self) -> None:
-        if not self.parent or not self.is_empty:
+        if not self.parent or not self.is_empty():
             return
 
         path = self.parent.joinpath(f'{self.name}{self.suffix}')
         if not path.exists():
             raise Exception(f'Data not found in the designated path: {str(path)}')
-        
+
         with open(path, 'r') as file:
-            lines = file.readlines()
-
-            if not lines:
-                self.items.append(Annotation())
-                return
-
-            for line in lines:
-                parts = line.replace('\n', '').split(' ')
-
-                bbox = []
-                points2D = []
-
-                coords_length = len(parts[1:])
-                if coords_length == 5:
-                    bbox = Bbox(coords=[float(n) for n in parts[1:5]])
-                    Bbox(orientation=parts[5])
-                elif coords_length == 4:
-                    bbox = Bbox(coords=parts[1:])
-                    bbox.to_float()
-                else:
-                    points2D = Points2D([float(n) for n in parts[1:]])
-
-                self.items.append(Annotation(
-                    bbox=bbox,
-                    class_id=int(parts[0]),
-                    points=points2D,
-                ))  
+            self.loads(file.read())
 
-    def merge(self, config: dict[str, str]) -> None:
-        items: list[Annotation] = self.copy()
-        self.clean()
+    def loads(self, text: str) -> None:
+        '''Replace the items with those parsed from YOLO label text.'''
+        self.assign(*parse(text))
 
+    def merge(self, config: dict[str, str]) -> None:
         classes = config['classes']
         merges = config['merges']
-        for anno in items:
-            if anno.class_id in merges:
-                anno.class_id = merges[anno.class_id]
-                anno.class_name = classes[anno.class_id]
-                self.add(anno)
-            else:
-                self.add(anno)
+
+        self._own()
+        original = self.class_ids.copy()
+        for source, target in merges.items():
+            selected = np.flatnonzero(original == source)
+            self.class_ids[selected] = target
+            for index in selected.tolist():
+                self.class_names[index] = classes[target]
+
+    def normalize(self, height: int | float, width: int | float) -> None:
+        '''Scale pixel boxes and points to the [0, 1] range.'''
+        self._own()
+        self.boxes /= np.array([width, height, width, height])
+        self.points[0::2] /= width
+        self.points[1::2] /= height
 
     def save(self, name: str) -> None:
-        if not self.items:
+        if self.is_empty():
             return
-        
+
         path = self.parent.joinpath(f'{name}{self.suffix}')
         with open(path, 'w', encoding='utf-8') as file:
-            for anno in self.items:
-                coords: list[str] = []
+            file.write(self.dumps())
+
+    def select(self, mask: np.ndarray) -> None:
+        '''Keep only the items selected by a boolean mask.'''
+        mask = np.asarray(mask, dtype=bool)
+        lengths = np.diff(self.offsets)
+        self.boxes = self.boxes[mask]
+        self.class_ids = self.class_ids[mask]
+        self.class_names = [n for n, keep in zip(self.class_names, mask.tolist()) if keep]
+        self.confidences = self.confidences[mask]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths[mask])]).astype(np.int64)
+        self.orientations = self.orientations[mask]
+        self.points = self.points[np.repeat(mask, lengths)]
+        self.shared = False
+
+    def to_xywh(self) -> None:
+        '''Convert boxes from corners (x1, y1, x2, y2) to center and size (xc, yc, w, h).'''
+        if self.format == 'xywh':
+            return
+        self._own()
+        x1, y1, x2, y2 = self.boxes.T
+        self.boxes = np.stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], axis=1)
+        self.format = 'xywh'
+
+    def to_xyxy(self) -> None:
+        '''Convert boxes from center and size (xc, yc, w, h) to corners (x1, y1, x2, y2).'''
+        if self.format == 'xyxy':
+            return
+        self._own()
+        xc, yc, w, h = self.boxes.T
+        self.boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+        self.format = 'xyxy'
+
+def parse(text: str) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    '''
+    Parse YOLO label text in bulk into (class_ids, boxes, orientations, points, offsets).
+    Lines with 4 values are boxes, 5 values oriented boxes, anything else points. An empty
+    text yields a single item without class, marking a background sample.
+    '''
+    lengths = np.array([len(line.split()) for line in text.splitlines()], dtype=np.int64)
+    lengths = lengths[lengths > 0]
+    if not len(lengths):
+        return (
+            np.full((1,), -1, dtype=np.int64),
+            np.full((1, 4), np.nan),
+            np.full((1,), np.nan),
+            np.empty((0,), dtype=np.float64),
+            np.zeros((2,), dtype=np.int64),
+        )
+
+    values = np.array(text.split(), dtype=np.float64)
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    sizes = lengths - 1
+
+    is_box = (sizes == 4) | (sizes == 5)
+    boxes = np.full((len(lengths), 4), np.nan)
+    boxes[is_box] = values[starts[is_box, None] + np.arange(1, 5)]
+    boxes[sizes == 4] = boxes[sizes == 4].round(4)
+
+    orientations = np.full((len(lengths),), np.nan)
+    orientations[sizes == 5] = values[starts[sizes == 5] + 5]
+
+    point_sizes = np.where(is_box, 0, sizes)
+    tokens = np.repeat(~is_box, lengths)
+    tokens[starts] = False
+    offsets = np.concatenate([[0], np.cumsum(point_sizes)]).astype(np.int64)
+
+    return values[starts].astype(np.int64), boxes, orientations, values[tokens], offsets
+
+def _box_row(bbox: Bbox | None) -> list[float]:
+    if not bbox or not bbox.coords:
+        return [np.nan] * 4
+    return [float(n) for n in bbox.coords[:4]]
 
-                if anno.bbox:
-                    coords = [f'{n}' for n in anno.bbox.coords]
-                if anno.points:
-                    coords = [f'{n}' for n in anno.points.coords]
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
 
-                if anno.class_id is not None:
-                    file.write(f'{anno.class_id} {' '.join(coords)}\n')
\ No newline at end of file
+def _orientation(bbox: Bbox | None) -> float:
+    if not bbox or bbox.orientation is None:
+        return np.nan
+    return float(bbox.orientation)
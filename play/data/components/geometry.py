@@ -9,19 +9,19 @@ import numpy as np
 class Label(ABC):
     coords: list[float | int] | None = None
 
+    def _scale(self, height: int | float, width: int | float) -> np.ndarray:
+        scale = np.empty(len(self.coords))
+        scale[0::2] = width
+        scale[1::2] = height
+        return scale
+
     def denormalize(self, height: int | float, width: int | float) -> None:
-        for idx, coord in enumerate(self.coords):
-            if idx % 2 != 0:
-                self.coords[idx] = int(coord * height)
-            else:
-                self.coords[idx] = int(coord * width) 
+        coords = np.asarray(self.coords, dtype=np.float64) * self._scale(height, width)
+        self.coords = coords.astype(np.int64).tolist()
 
     def normalize(self, height: int | float, width: int | float) -> None:
-        for idx, coord in self.coords:
-            if idx % 2 != 0:
-                self.coords[idx] = round(coord / height, 4)
-            else:
-                self.coords[idx] = round(coord / width, 4)
+        coords = np.asarray(self.coords, dtype=np.float64) / self._scale(height, width)
+        self.coords = coords.round(4).tolist()
     
     def size(self) -> int:
         return len(self.coords)
@@ -57,7 +57,7 @@ class Bbox(Label):
         super().normalize(height, width)
     
     def to_array(self) -> np.ndarray:
-        super().to_array()
+        return super().to_array()
 
     def to_float(self) -> None:
         super().to_float()
@@ -104,7 +104,7 @@ class Points2D(Label):
         super().normalize(height, width)
     
     def to_array(self) -> np.ndarray:
-        super().to_array()
+        return super().to_array()
 
     def to_float(self) -> None:
         super().to_float()
@@ -114,7 +114,7 @@ class Points2D(Label):
         
     def to_mask(self, image: np.ndarray) -> np.ndarray:
         filled = np.zeros_like(image)
-        polygon = self.to_array(self.coords)
+        polygon = self.to_array().reshape(-1, 2)
         mask = cv2.fillPoly(filled, pts=np.int32([polygon]), color=(255,255,255))
         return mask
 
@@ -1,43 +1,265 @@
 from dataclasses import dataclass, field
+import io
 from pathlib import Path
+from typing import BinaryIO
 
 import cv2
 import numpy as np
 
+from play.utils.files import transfer
+
 from .component import Component
 
 
+JPEG_SUFFIXES = ('.jpeg', '.jpg')
+REDUCED = {  # scale: (color, grayscale) flags decoding a JPEG at a fraction of its size with DCT scaling
+    8: (cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    4: (cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    2: (cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+}
+SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg_header(stream: BinaryIO) -> tuple[int, int, int] | None:
+    '''(height, width, components) from the frame header of a JPEG stream, reading only its markers.'''
+    if stream.read(2) != b'\xff\xd8':
+        return None
+
+    while True:
+        marker = stream.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        while marker[1] == 0xFF:  # fill bytes
+            marker = marker[1:] + stream.read(1)
+        if marker[1] == 0x01 or 0xD0 <= marker[1] <= 0xD8:  # markers without a segment
+            continue
+
+        length = int.from_bytes(stream.read(2), 'big')
+        if marker[1] in SOF:
+            segment = stream.read(6)
+            if len(segment) < 6:
+                return None
+            return int.from_bytes(segment[1:3], 'big'), int.from_bytes(segment[3:5], 'big'), segment[5]
+        if marker[1] == 0xDA or length < 2:  # scan data before any frame header
+            return None
+        stream.seek(length - 2, io.SEEK_CUR)
+
+@dataclass
+class Encoding:
+    '''
+    Encoder settings for written images. `format` overrides the file suffix (e.g. ".webp");
+    untouched images keep their source bytes unless `reencode` is set or the format changes.
+    '''
+    compression: int | None = None  # png 0-9
+    format: str | None = None
+    optimize: bool = False
+    progressive: bool = False
+    quality: int | None = None  # jpeg and webp 0-100
+    reencode: bool = False
+
+    def params(self, suffix: str) -> list[int]:
+        '''cv2.imwrite/imencode parameters for the given suffix.'''
+        params: list[int] = []
+        match suffix.lower():
+            case '.jpg' | '.jpeg':
+                if self.quality is not None:
+                    params += [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+                if self.optimize:
+                    params += [cv2.IMWRITE_JPEG_OPTIMIZE, 1]
+                if self.progressive:
+                    params += [cv2.IMWRITE_JPEG_PROGRESSIVE, 1]
+            case '.png':
+                if self.compression is not None:
+                    params += [cv2.IMWRITE_PNG_COMPRESSION, self.compression]
+            case '.webp':
+                if self.quality is not None:
+                    params += [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        return params
+
+    def suffix(self, suffix: str) -> str:
+        if not self.format:
+            return suffix
+        return self.format if self.format.startswith('.') else f'.{self.format}'
+
 @dataclass
 class Image(Component):
+    '''
+    Holds either decoded pixels (content) or encoded bytes (buffer), never both.
+    Copies share the pixel buffer; call `mutable` before writing pixels in place.
+    While the pixels are still those of the source file, saving transfers its bytes
+    instead of decoding and re-encoding them.
+    '''
     content: np.ndarray = field(default_factory=lambda: np.empty((0)))
 
-    def copy(self) -> None:
-        if self.is_empty():
-            self.load()
+    buffer: bytes | None = field(default=None, repr=False)
+    encoded: Encoding | None = field(default=None, repr=False)
+    origin: np.ndarray | bytes | None = field(default=None, repr=False)
+    shared: bool = field(default=False, repr=False)
+    source: Path | None = field(default=None, repr=False)
+
+    def _flags(self, size: tuple[int, int] | None, stream: BinaryIO) -> int:
+        '''Decode flags: the smallest DCT scale of a JPEG still covering size (width, height), else unchanged.'''
+        if not size or self.suffix.lower() not in JPEG_SUFFIXES:
+            return cv2.IMREAD_UNCHANGED
+
+        header = _jpeg_header(stream)
+        if header is None or header[2] not in (1, 3):
+            return cv2.IMREAD_UNCHANGED
 
+        height, width, components = header
+        for scale, flags in REDUCED.items():
+            if width // scale >= size[0] and height // scale >= size[1]:
+                # unchanged JPEG reads ignore the EXIF orientation, so reduced ones must too
+                return flags[components == 1] | cv2.IMREAD_IGNORE_ORIENTATION
+        return cv2.IMREAD_UNCHANGED
+
+    def copy(self) -> 'Image':
+        self.shared = not self.is_empty()
         return Image(
-            content=self.content.copy() if not self.is_empty() else np.empty((0)),
+            buffer=self.buffer,
+            content=self.content,
+            encoded=self.encoded,
             name=self.name,
+            origin=self.origin,
             parent=self.parent,
+            shared=self.shared,
+            source=self.source,
             suffix=self.suffix,
         )
 
+    def decode(self, size: tuple[int, int] | None = None) -> None:
+        '''Decode the buffered bytes into content and release the buffer; see `load` for size.'''
+        if not self.is_empty() or not self.buffer:
+            return
+
+        flags = self._flags(size, io.BytesIO(self.buffer))
+        array = np.frombuffer(self.buffer, dtype=np.uint8)
+        self.content = cv2.imdecode(array, flags)
+        if self.origin is self.buffer:
+            self.origin = self.content if flags == cv2.IMREAD_UNCHANGED else None
+        self.buffer, self.encoded = None, None
+
+    def encode(self, encoding: Encoding | None = None) -> None:
+        '''Encode content into the buffer, in the format given by the suffix, and release the pixels.'''
+        self.reformat(encoding)
+        if self.is_empty() and self.buffer is not None and self.encoded == encoding:
+            return  # already encoded with these settings
+        reencode = bool(encoding and encoding.reencode)
+        if self.is_pristine() and not reencode:
+            if not self.is_empty():
+                self.content, self.origin, self.shared = np.empty((0)), None, False  # saved from the source
+            return
+
+        if self.is_empty():
+            if not reencode:
+                return
+            self.load()
+            if self.is_empty():
+                return
+
+        params = encoding.params(self.suffix) if encoding else []
+        success, encoded = cv2.imencode(self.suffix, self.content, params)
+        if not success:
+            raise ValueError(f'Failed to encode image {self.name} as {self.suffix}')
+        self.buffer = encoded.tobytes()
+        self.content = np.empty((0))
+        self.encoded = encoding
+        self.shared = False
+
     def is_empty(self) -> bool:
         return self.content.size <= 0
+
+    def is_pristine(self) -> bool:
+        '''True while the pixels are those of the source file: not loaded yet, or loaded and untouched.'''
+        if not self.source or Path(self.source).suffix.lower() != self.suffix.lower():
+            return False
+        if self.is_empty() and self.buffer is None:
+            return True
+        return self.origin is not None and (self.content is self.origin or self.buffer is self.origin)
     
-    def load(self) -> None:
-        if not self.parent or not self.is_empty():
+    def load(self, size: tuple[int, int] | None = None) -> None:
+        '''
+        Decode the image. When the pixels will be reduced to size (width, height), JPEGs
+        are decoded at the smallest 1/2, 1/4 or 1/8 scale still at least that large.
+        '''
+        if not self.is_empty():
+            return
+        if self.buffer:
+            self.decode(size)
+            return
+        if not self.parent:
             return
         
         path = self.parent.joinpath(f'{self.name}{self.suffix}')
         if not path.exists():
             return 
-        self.content = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        flags = cv2.IMREAD_UNCHANGED
+        if size and self.suffix.lower() in JPEG_SUFFIXES:
+            with open(path, 'rb') as file:
+                flags = self._flags(size, file)
+        self.content = cv2.imread(path, flags)
+        if path == self.source and flags == cv2.IMREAD_UNCHANGED:
+            self.origin = self.content
+
+    def mutable(self) -> np.ndarray:
+        '''Return content safe to modify in place, copying it first if other images share it.'''
+        self.load()
+        if self.shared:
+            self.content = self.content.copy()
+            self.shared = False
+        self.origin = None
+        return self.content
 
     def path(self) -> Path:
         return self.parent.joinpath(f'{self.name}{self.suffix}')
-    
-    def save(self, name: str) -> None:
+
+    def read(self) -> None:
+        '''Read the encoded file into the buffer without decoding it.'''
+        if not self.is_empty() or self.buffer or not self.parent:
+            return
+
+        path = self.path()
+        if path.exists():
+            self.buffer = path.read_bytes()
+            if path == self.source:
+                self.origin = self.buffer
+
+    def reformat(self, encoding: Encoding | None) -> None:
+        '''Apply the format override of encoding to the suffix; encoded bytes in another format are decoded.'''
+        if not encoding:
+            return
+        suffix = encoding.suffix(self.suffix)
+        if suffix.lower() != self.suffix.lower():
+            self.load()
+            self.suffix = suffix
+
+    def save(self, name: str, mode: str = 'copy', encoding: Encoding | None = None) -> None:
+        '''Write the image; untouched pixels are transferred from the source by mode instead.'''
+        self.reformat(encoding)
+        path = self.parent.joinpath(f'{name}{self.suffix}')
+        if self.is_pristine() and Path(self.source).exists() and not (encoding and encoding.reencode):
+            transfer(Path(self.source), path, mode)
+            return
+
+        if encoding and encoding.reencode and self.buffer is None:
+            self.load()
         if not self.is_empty():
-            path = self.parent.joinpath(f'{name}{self.suffix}')
-            cv2.imwrite(path, self.content)
+            cv2.imwrite(path, self.content, encoding.params(self.suffix) if encoding else [])
+        elif self.buffer:
+            path.write_bytes(self.buffer)
+
+    def shape(self) -> tuple[int, int] | None:
+        '''(height, width) of the pixels, read from the JPEG header when not decoded yet; None if unknown.'''
+        if not self.is_empty():
+            return self.content.shape[:2]
+        if self.suffix.lower() not in JPEG_SUFFIXES:
+            return None
+
+        if self.buffer:
+            header = _jpeg_header(io.BytesIO(self.buffer))
+        elif self.parent and self.path().exists():
+            with open(self.path(), 'rb') as file:
+                header = _jpeg_header(file)
+        else:
+            return None
+        return header[:2] if header else None
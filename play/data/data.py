@@ -2,7 +2,7 @@ from dataclasses import dataclass
 from pathlib import Path
 
 from .components.annotation import Annotations
-from .components.image import Image
+from .components.image import Encoding, Image
 from .components.text import Text
 
 
@@ -12,32 +12,38 @@ class Data:
 
     annotations: Annotations | None = None
     image: Image | None = None
+    output: str | None = None
     text: Text | None = None
 
     def copy(self) -> 'Data':
+        '''Shallow copy: components share their buffers until one of them is modified.'''
         return Data(
-            annotations=self.annotations.copy(),
-            image=self.image.copy(),
+            annotations=self.annotations.copy() if self.annotations is not None else None,
+            image=self.image.copy() if self.image else None,
             name=self.name,
+            output=self.output,
+            text=self.text,
         )
     
     def load(self) -> None:
-        self.annotations.load()
-        self.image.load()
+        '''Load annotations; image pixels are decoded lazily by the processes that need them.'''
+        if self.annotations is not None:
+            self.annotations.load()
 
     def move(self, dst: Path) -> None:
-        if self.annotations:
+        if self.annotations is not None:
             self.annotations.parent = dst
         if self.image:
             self.image.parent = dst
         if self.text:
             self.text.parent = dst
 
-    def save(self) -> None:
-        if self.annotations:
+    def save(self, mode: str = 'copy', encoding: Encoding | None = None) -> None:
+        '''Save every component; mode is how untouched images are transferred from their source.'''
+        if self.annotations is not None:
             self.annotations.save(self.name)
         if self.image:
-            self.image.save(self.name)
+            self.image.save(self.name, mode, encoding)
         if self.text:
             self.text.save(self.name)
             
\ No newline at end of file
@@ -2,6 +2,7 @@ from .csv import CSVIngestor
 from .dir import DirIngestor
 from .factory import IngestorFactory
 from .ingest import Ingestor
+from .storage import StorageIngestor
 
 
-__all__ = ('CSVIngestor', 'DirIngestor', 'IngestorFactory', 'Ingestor')
\ No newline at end of file
+__all__ = ('CSVIngestor', 'DirIngestor', 'IngestorFactory', 'Ingestor', 'StorageIngestor')
\ No newline at end of file
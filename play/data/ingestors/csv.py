@@ -1,11 +1,16 @@
 
+from collections import deque
+from concurrent.futures import Future
+import json
 from pathlib import Path
+from threading import Lock
 from typing import Generator
 
 import pandas as pd
 
 from play.common import Context
 
+from ..components import Image
 from ..data import Data
 from .ingest import Ingestor
 from ..utils import Downloader
@@ -18,58 +23,189 @@ class CSVIngestor(Ingestor):
         - image: path to the image file (local or URL)
         - text: path to the txt file (local or URL)
         - class: id (int) or name (str) of the class
+
+    Rows are streamed in chunks of `chunk_size` reading only the input columns, so
+    memory does not grow with the manifest. Remote inputs of the next `prefetch` rows are
+    downloaded in the background, as long as the prefetched files, and the requests in
+    flight at the mean download size, stay within `prefetch_bytes`; samples are still
+    yielded in row order. With `in_memory`, remote
+    images are kept as encoded bytes and decoded from memory instead of the cache file.
     '''
+    COLUMNS = ('annotations', 'images', 'texts')
+
     def __init__(self, context: Context, path: Path, downloader: Downloader) -> None:
         super().__init__(context=context, path=path)
-        
+
         self.context.logger.info(f'Loading data from csv: {self.path}')
-        self.df = pd.read_csv(self.path)
+        self.chunk_size: int = self.context.config.get('chunk_size', 10000)
+        self.columns = [c for c in pd.read_csv(self.path, nrows=0).columns if c in self.COLUMNS]
         self.downloader = downloader
+        self.rows: int | None = None
+
+        download = self.context.config.get('download') or {}
+        self.in_memory: bool = download.get('in_memory', False)
+        self.prefetch: int = download.get('prefetch', 32)
+        self.prefetch_bytes: int = download.get('prefetch_bytes', 512 * 1024 * 1024)
+
+        self.buffered = 0  # bytes downloaded for rows not yielded yet
+        self.completed: tuple[int, int] = (0, 0)  # finished downloads and their bytes
+        self.in_flight = 0
+        self.lock = Lock()
+        self.released: set[Future] = set()  # yielded before their callback ran
+        self.sizes: dict[Future, int] = {}
 
         self.context.logger.info(f'Found total of {self.size()} inputs')
 
-    def _parse_input(self, input: str) -> Path | None:
-        if input.startswith('http'):
+    def _count_rows(self) -> int:
+        '''Count data rows from the line breaks, without parsing; embedded newlines in quoted fields are not supported.'''
+        lines, last = 0, b'\n'
+        with open(self.path, 'rb') as file:
+            while block := file.read(1 << 20):
+                lines += block.count(b'\n')
+                last = block[-1:]
+        if last != b'\n':
+            lines += 1
+        return max(lines - 1, 0)
+
+    def _create(self, row: tuple, prefetched: dict[str, Future]) -> Data:
+        annotations, image, text = None, None, None
+        name = ''
+
+        if 'annotations' in self.columns and getattr(row, 'annotations'):
+            if self.task == 'classify':
+                annotations = super()._load_class(row.annotations)
+            else:
+                anno_path = self._parse_input(row.annotations, prefetched)
+                annotations = super()._load_anno(anno_path)
+            if not name:
+                name = annotations.name
+        if 'images' in self.columns and getattr(row, 'images'):
+            image = self._load_remote(row.images, prefetched)
+            if image is None:
+                image = super()._load_img(self._parse_input(row.images, prefetched))
+            name = image.name
+        if 'texts' in self.columns and getattr(row, 'texts'):
+            text_path = self._parse_input(row.texts, prefetched)
+            text = super()._load_text(text_path)
+            if not name:
+                name = text.name
+
+        return Data(
+            name=name,
+            annotations=annotations,
+            image=image,
+            text=text,
+        )
+
+    def _done(self, future: Future) -> None:
+        '''Count a finished download against the budget until its row is yielded.'''
+        size = 0
+        try:
+            if not future.cancelled() and future.exception() is None:
+                result = future.result()
+                size = len(result) if isinstance(result, bytes) else result.stat().st_size
+        except OSError:
+            pass
+
+        with self.lock:
+            self.in_flight -= 1
+            self.completed = (self.completed[0] + 1, self.completed[1] + size)
+            if future in self.released:
+                self.released.discard(future)
+            else:
+                self.sizes[future] = size
+                self.buffered += size
+
+    def _full(self) -> bool:
+        '''Whether the buffered bytes, with the requests in flight at the mean download size, exceed the budget.'''
+        with self.lock:
+            count, total = self.completed
+            return self.buffered + self.in_flight * (total // count if count else 0) > self.prefetch_bytes
+
+    def _load_remote(self, input: str, prefetched: dict[str, Future]) -> Image | None:
+        '''Image decoded from fetched bytes, when in-memory loading applies to input.'''
+        if not self.in_memory or not input.startswith('http'):
+            return None
+
+        buffer = prefetched[input].result() if input in prefetched else self.downloader.fetch(input)
+        name, suffix = self.downloader.parser_url(input)
+        return super()._load_img(Path(f'{name}.{suffix}'), buffer=buffer)
+
+    def _next(self, pending: deque[tuple[tuple, dict[str, Future]]]) -> Data:
+        row, futures = pending.popleft()
+        data = self._create(row, futures)
+        self._release(futures)
+        return data
+
+    def _parse_input(self, input: str, prefetched: dict[str, Future] | None = None) -> Path | None:
+        if prefetched and input in prefetched:
+            parsed_input = prefetched[input].result()
+        elif input.startswith('http'):
             parsed_input = self.downloader.download(input)
         else:
             parsed_input = Path(input)
         return parsed_input
 
-    def load(self) -> Generator[Data, None, None]:
-        columns = set(self.df.columns)  # faster lookup
-
-        has_image = 'images' in columns
-        has_text = 'texts' in columns
-        has_annotation = 'annotations' in columns
+    def _prefetch(self, row: tuple) -> dict[str, Future]:
+        '''Start downloading the remote inputs of a row.'''
+        futures: dict[str, Future] = {}
+        if not self.prefetch:
+            return futures
 
-        for row in self.df.itertuples(index=False):
-            annotations, image, text = None, None, None
-            name = ''
+        for column in self.columns:
+            if column == 'annotations' and self.task == 'classify':
+                continue
+            value = getattr(row, column)
+            if isinstance(value, str) and value.startswith('http') and value not in futures:
+                with self.lock:
+                    self.in_flight += 1
+                futures[value] = self.downloader.submit(value, content=self.in_memory and column == 'images')
+                futures[value].add_done_callback(self._done)
+        return futures
 
-            if has_annotation and getattr(row, 'annotations'):
-                if self.task == 'classify':
-                    annotations = super()._load_class(row.annotations)
+    def _release(self, futures: dict[str, Future]) -> None:
+        '''Take the downloads of a yielded row off the budget.'''
+        with self.lock:
+            for future in futures.values():
+                if future in self.sizes:
+                    self.buffered -= self.sizes.pop(future)
                 else:
-                    anno_path = self._parse_input(row.annotations)
-                    annotations = super()._load_anno(anno_path)
-                if not name:
-                    name = annotations.name
-            if has_image and getattr(row, 'images'):
-                img_path = self._parse_input(row.images)
-                image = super()._load_img(img_path)
-                name = image.name
-            if has_text and getattr(row, 'texts'):
-                text_path = self._parse_input(row.texts)
-                text = super()._load_text(text_path)
-                if not name:
-                    name = text.name
-
-            yield Data(
-                name=name,
-                annotations=annotations,
-                image=image,
-                text=text,
-            )
+                    self.released.add(future)
+
+    def _rows(self) -> Generator[tuple, None, None]:
+        for chunk in pd.read_csv(self.path, chunksize=self.chunk_size, usecols=self.columns):
+            yield from chunk.itertuples(index=False)
+
+    def load(self) -> Generator[Data, None, None]:
+        pending: deque[tuple[tuple, dict[str, Future]]] = deque()
+        for row in self._rows():
+            pending.append((row, self._prefetch(row)))
+            while pending and (len(pending) > self.prefetch or self._full()):
+                yield self._next(pending)
+
+        while pending:
+            yield self._next(pending)
 
     def size(self) -> int:
-        return self.df.shape[0]
+        '''Row count, cached next to the csv as <name>.meta.json and reused while the file is unchanged.'''
+        if self.rows is not None:
+            return self.rows
+
+        stat = self.path.stat()
+        meta = self.path.with_name(f'{self.path.name}.meta.json')
+        try:
+            with open(meta, 'r', encoding='utf-8') as file:
+                cached = json.load(file)
+            if (cached['size'], cached['mtime']) == (stat.st_size, stat.st_mtime_ns):
+                self.rows = int(cached['rows'])
+                return self.rows
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self.rows = self._count_rows()
+        try:
+            with open(meta, 'w', encoding='utf-8') as file:
+                json.dump({'mtime': stat.st_mtime_ns, 'rows': self.rows, 'size': stat.st_size}, file)
+        except OSError:
+            pass
+        return self.rows
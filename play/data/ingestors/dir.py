@@ -1,10 +1,10 @@
-from collections import defaultdict
 from pathlib import Path
 from typing import Generator
 
 from play.common import Context
 from play.data import Data
 
+from .index import DirIndex
 from .ingest import Ingestor
 
 
@@ -28,86 +28,73 @@ class DirIngestor(Ingestor):
     def __init__(self, context: Context, path: Path) -> None:
         super().__init__(context=context, path=path)
         self.files: list[Path] = []
-        
+        self.samples: dict[str, dict[str, Path]] = {}
+
         self.context.logger.info(f'Loading data from directory: {self.path}')
+        self.index = DirIndex(root=self.path, workers=self.context.config.get('scan_workers', 8))
+        self.index.refresh(folders=self.FOLDERS)
+        self.context.logger.info(
+            f'Indexed {self.index.scanned} directories ({self.index.changed} rescanned)',
+            index=str(self.index.path),
+        )
+
         if self.task == 'classify':
             self._collect_classify_files()
         else:
             self._collect_multimodal_files()
+        self._group()
 
-        try:
-            folder_names = [f.name for f in self.path.iterdir() if f.is_dir() and f.name in self.FOLDERS]
-        except Exception:
+        folder_names = [name for name in self.FOLDERS if name in self.index.dirs]
+        if not folder_names:
             msg = f'None of the required folders were found in the directory: {self.path}'
             self.context.logger.error(msg)
             raise FileNotFoundError(msg)
-        
+
         self.context.logger.info(f'Found files in the folders: {folder_names}')
         self.context.logger.info(f'Ingesting {self.size()} samples into the pipeline')
 
     def _collect_classify_files(self) -> None:
         img_dir = self.path.joinpath('images')
-        if not img_dir.exists():
+        if 'images' not in self.index.dirs:
             msg = f'Image directory does not exist: {img_dir}. Required for classification task.'
             self.context.logger.error(msg)
             raise NotADirectoryError(msg)
-        
-        for ext in self.IMAGE_EXTS:
-            self.files.extend(img_dir.glob(f'**/*{ext}'))
+
+        self.files.extend(self.index.files('images', self.IMAGE_EXTS))
         self.context.logger.debug(f'Collected {len(self.files)} images at: {img_dir}')
-        
+
         if not self.files:
             message = f'No images found at: {img_dir}. Check the format of your directory or the task.'
             self.context.logger.error(message)
             raise FileNotFoundError(message)
 
     def _collect_multimodal_files(self) -> None:
-        img_dir = self.path.joinpath('images')
-        txt_dir = self.path.joinpath('texts')
-        anno_dir = self.path.joinpath('annotations')
-
-        if anno_dir.exists():
-            for ext in self.ANNO_EXTS:
-                self.files.extend(anno_dir.glob(f'**/*{ext}'))
-            self.context.logger.debug(f'Collected annotations from: {anno_dir}')
-        
-        if img_dir.exists():
-            for ext in self.IMAGE_EXTS:
-                self.files.extend(img_dir.glob(f'**/*{ext}'))
-            self.context.logger.debug(f'Collected images from: {img_dir}')
-        
-        if txt_dir.exists():
-            for ext in self.TEXT_EXTS:
-                self.files.extend(txt_dir.glob(f'**/*{ext}'))
-            self.context.logger.debug(f'Collected texts from: {txt_dir}')
+        for folder, exts in zip(self.FOLDERS, (self.ANNO_EXTS, self.IMAGE_EXTS, self.TEXT_EXTS)):
+            if folder in self.index.dirs:
+                self.files.extend(self.index.files(folder, exts))
+                self.context.logger.debug(f'Collected {folder} from: {self.path.joinpath(folder)}')
 
         if not self.files:
             message = f'No images, texts, or annotations found at: {self.path}. Check the directory format.'
             self.context.logger.error(message)
             raise ValueError(message)
 
-    def load(self) -> Generator[Data, None, None]:
-        grouped: dict[str, dict[str, Path]] = defaultdict(dict)
+    def _group(self) -> None:
+        '''Group files by stem under the top folder they belong to, so nested files are kept.'''
+        keys = {'annotations': 'annotations', 'images': 'image', 'texts': 'text'}
         for filepath in self.files:
-            stem = filepath.stem
-            parent = filepath.parent.name
+            folder = filepath.relative_to(self.path).parts[0]
+            if folder in keys:
+                self.samples.setdefault(filepath.stem, {})[keys[folder]] = filepath
 
-            if parent == 'annotations':
-                grouped[stem]['annotations'] = filepath
-            elif parent == 'images':
-                grouped[stem]['image'] = filepath
-            elif parent == 'texts':
-                grouped[stem]['text'] = filepath
-
-        for stem, parts in grouped.items():
+    def load(self) -> Generator[Data, None, None]:
+        for stem, parts in self.samples.items():
             data = Data(name=stem)
 
-            if 'annotations' in parts:
-                if self.task == 'classify':
-                    cls = parts['annotations'].parent.name
-                    data.annotations = self._load_class(cls)
-                else:
-                    data.annotations = self._load_anno(parts['annotations'])
+            if self.task == 'classify' and 'image' in parts:
+                data.annotations = self._load_class(parts['image'].parent.name)
+            elif 'annotations' in parts:
+                data.annotations = self._load_anno(parts['annotations'])
             if 'image' in parts:
                 data.image = self._load_img(parts['image'])
             if 'text' in parts:
@@ -119,4 +106,4 @@ class DirIngestor(Ingestor):
         '''Return number of unique samples (by stem) or total files if flag "all" is set.'''
         if all:
             return len(self.files)
-        return len({f.stem for f in self.files})
+        return len(self.samples)
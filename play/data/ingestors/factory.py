@@ -6,6 +6,7 @@ from .csv import CSVIngestor
 from .dir import DirIngestor
 from ..utils import Downloader
 from .ingest import Ingestor
+from .storage import StorageIngestor
 
 
 class IngestorFactory:
@@ -22,9 +23,22 @@ class IngestorFactory:
             raise ValueError(message)
         
         if path.suffix == '.csv':
+            download = context.config.get('download') or {}
             return CSVIngestor(
                 context=input_ctx,
-                downloader=Downloader(),
+                downloader=Downloader(
+                    path=Path(download.get('cache', '.projects/cache')),
+                    max_bytes=download.get('max_bytes'),
+                    per_host=download.get('per_host', 4),
+                    retries=download.get('retries', 3),
+                    workers=download.get('workers', 16),
+                    write_through=download.get('write_through', True),
+                ),
+                path=path,
+            )
+        elif path.is_dir() and StorageIngestor.is_storage(path):
+            return StorageIngestor(
+                context=input_ctx,
                 path=path,
             )
         elif path.is_dir():
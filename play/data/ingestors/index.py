@@ -0,0 +1,99 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import json
+import os
+from pathlib import Path
+
+
+class DirIndex:
+    '''
+    Persisted listing of a directory tree, stored as `.index.json` at its root. Each
+    directory keeps its mtime, files and subdirectories; on refresh a directory whose
+    mtime did not change reuses its listing, so only changed directories are read again.
+    Directories are scanned in parallel with `os.scandir`.
+    '''
+    FILENAME = '.index.json'
+    VERSION = 1
+
+    def __init__(self, root: Path, workers: int = 8) -> None:
+        self.root = root
+        self.path = root.joinpath(self.FILENAME)
+        self.workers = max(workers, 1)
+
+        self.dirs: dict[str, dict] = {}
+        self.changed = 0
+        self.scanned = 0
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return index.get('dirs', {}) if index.get('version') == self.VERSION else {}
+
+    def _scan(self, relative: str, previous: dict | None) -> dict:
+        '''List one directory, reusing the previous listing when its mtime is unchanged.'''
+        path = self.root.joinpath(relative) if relative else self.root
+        mtime = path.stat().st_mtime_ns
+        if previous and previous['mtime'] == mtime:
+            return previous
+
+        files: list[str] = []
+        dirs: list[str] = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=True):
+                    dirs.append(entry.name)
+                elif entry.name != self.FILENAME:
+                    files.append(entry.name)
+
+        return {'dirs': sorted(dirs), 'files': sorted(files), 'mtime': mtime}
+
+    def files(self, folder: str = '', exts: tuple[str, ...] | None = None) -> list[Path]:
+        '''Files under folder (relative to the root), recursively, optionally filtered by extension.'''
+        prefix = folder.strip('/')
+        paths: list[Path] = []
+        for relative, listing in self.dirs.items():
+            if prefix and relative != prefix and not relative.startswith(f'{prefix}/'):
+                continue
+            base = self.root.joinpath(relative) if relative else self.root
+            paths.extend(
+                base.joinpath(name) for name in listing['files']
+                if not exts or os.path.splitext(name)[1].lower() in exts
+            )
+        return paths
+
+    def refresh(self, folders: tuple[str, ...] | None = None) -> None:
+        '''Walk the tree (or only the given top folders), rescanning changed directories.'''
+        previous = self._load()
+        self.changed, self.dirs = 0, {}
+
+        roots = [name for name in folders if self.root.joinpath(name).is_dir()] if folders else ['']
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending: dict[Future, str] = {
+                pool.submit(self._scan, relative, previous.get(relative)): relative for relative in roots
+            }
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relative = pending.pop(future)
+                    listing = future.result()
+                    if listing is not previous.get(relative):
+                        self.changed += 1
+                    self.dirs[relative] = listing
+                    for name in listing['dirs']:
+                        child = f'{relative}/{name}' if relative else name
+                        pending[pool.submit(self._scan, child, previous.get(child))] = child
+
+        self.scanned = len(self.dirs)
+        if self.changed or set(previous) != set(self.dirs):
+            self.save()
+
+    def save(self) -> None:
+        temp = self.path.with_name(f'{self.FILENAME}.tmp')
+        try:
+            with open(temp, 'w', encoding='utf-8') as file:
+                json.dump({'dirs': self.dirs, 'version': self.VERSION}, file)
+            os.replace(temp, self.path)
+        except OSError:
+            pass  # read-only inputs are scanned every time
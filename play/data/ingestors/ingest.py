@@ -66,10 +66,13 @@ class Ingestor(ABC):
         )
         return annotations
 
-    def _load_img(self, path: Path) -> Image:
+    def _load_img(self, path: Path, buffer: bytes | None = None) -> Image:
+        '''Image at path, or held in memory and decoded from buffer when given.'''
         image: Image = Image(
+            buffer=buffer,
             name=str(path.stem),
-            parent=path.parent,
+            parent=None if buffer is not None else path.parent,
+            source=None if buffer is not None else path,
             suffix=path.suffix,
         )
 
@@ -0,0 +1,40 @@
+from pathlib import Path
+from typing import Generator
+
+from play.common import Context
+
+from ..data import Data
+from .ingest import Ingestor
+from ..utils import PackedStorage, ShardStorage
+
+
+class StorageIngestor(Ingestor):
+    '''
+    Reads the items of a packed (packed.bin + packed.jsonl) or sharded (shard-<n>.tar +
+    shard-<n>.jsonl) storage directory. Packed images arrive as zero-copy views into the
+    memory-mapped file; sharded images as encoded buffers decoded on load.
+    '''
+    def __init__(self, context: Context, path: Path) -> None:
+        super().__init__(context=context, path=path)
+
+        if self.is_packed(path):
+            self.storage = PackedStorage(context, path)
+        else:
+            self.storage = ShardStorage(context, path)
+
+        self.context.logger.info(f'Loading data from {type(self.storage).__name__}: {self.path}')
+        self.context.logger.info(f'Found total of {self.size()} inputs')
+
+    @staticmethod
+    def is_packed(path: Path) -> bool:
+        return path.joinpath('packed.jsonl').exists()
+
+    @staticmethod
+    def is_storage(path: Path) -> bool:
+        return StorageIngestor.is_packed(path) or any(path.glob('shard-*.jsonl'))
+
+    def load(self) -> Generator[Data, None, None]:
+        yield from self.storage.iterate()
+
+    def size(self) -> int:
+        return len(self.storage.index)
@@ -1,5 +1,5 @@
-from .factory import ProcessFactory, Processor
+from .factory import Node, ProcessFactory, Processor
 from .job import Job
 
 
-__all__ = ('Job', 'ProcessFactory', 'Processor')
\ No newline at end of file
+__all__ = ('Job', 'Node', 'ProcessFactory', 'Processor')
\ No newline at end of file
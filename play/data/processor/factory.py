@@ -5,6 +5,7 @@ from play.common import Context
 from play.data import Data
 
 from .job import Job
+from .plan import Plan
 from .process import (
     CropProcess,
     MaskProcess,
@@ -22,16 +23,104 @@ class Processor(ABC):
     def process(self, data: Data) -> Job:
         NotImplemented
 
+@dataclass
+class Node:
+    '''A process in a DAG processor, fed by the output of `input` ("source" for the loaded data).'''
+    id: str
+    input: str
+    process: Process
+
+    output: str | None = None
+
+class DAGProcessor(Processor):
+    '''
+    Runs processes as a graph: each node consumes the results of one upstream node, so
+    branches reuse shared intermediates instead of recomputing them. Sink nodes (those
+    with an output, or the leaves when none is set) tag their results with the output name.
+    The source image is decoded once for all branches, at the smallest JPEG scale that
+    still covers the largest size any of them needs.
+    '''
+    def __init__(self, nodes: list[Node]) -> None:
+        super().__init__(processes=[node.process for node in nodes])
+        self.nodes = nodes
+
+        known = {'source'}
+        for node in nodes:
+            if node.id in known:
+                raise ValueError(f'Duplicated DAG node id: {node.id}')
+            if node.input not in known:
+                raise ValueError(f'DAG node {node.id} reads from unknown node: {node.input}')
+            known.add(node.id)
+
+        consumed = {node.input for node in nodes}
+        self.sinks = [node for node in nodes if node.output] or [node for node in nodes if node.id not in consumed]
+
+        # Index of the last node reading each result, so intermediates are released early
+        sink_ids = {node.id for node in self.sinks}
+        self.last_use = {node.input: index for index, node in enumerate(nodes) if node.input not in sink_ids}
+
+    def _needs(self, input: str, shape: tuple[int, int]) -> list[tuple[int, int] | None]:
+        '''Source sizes needed by the pixel processes reading input, through the processes that pass it on.'''
+        needs: list[tuple[int, int] | None] = []
+        for node in self.nodes:
+            if node.input != input:
+                continue
+            if node.process.pixels:
+                needs.append(node.process.resolution(shape))
+                continue
+            if node in self.sinks:
+                needs.append(None)  # written untouched, so the decode must stay that of the source
+            needs.extend(self._needs(node.id, shape))
+        return needs
+
+    def _decode(self, data: Data) -> None:
+        '''Decode the source once for every branch, reduced when all of them need less than its full size.'''
+        if not data.image or not data.image.is_empty() or not any(node.process.pixels for node in self.nodes):
+            return
+
+        shape = data.image.shape()
+        needs = self._needs('source', shape) if shape else []
+        if not needs or None in needs:
+            data.image.load()
+        else:
+            data.image.load((max(width for width, _ in needs), max(height for _, height in needs)))
+
+    def process(self, data: Data) -> Job:
+        self._decode(data)
+        results: dict[str, list[Data]] = {'source': [data]}
+        for index, node in enumerate(self.nodes):
+            job: Job = Job(current=results[node.input])
+            node.process.run(job)
+            job.process_changes()
+            results[node.id] = job.current
+
+            if self.last_use.get(node.input) == index:
+                del results[node.input]
+
+        outputs: list[Data] = []
+        for node in self.sinks:
+            for item in results[node.id]:
+                copy: Data = item.copy()  # storage moves components, keep sinks independent
+                copy.output = node.output or item.output
+                outputs.append(copy)
+        return Job(current=outputs)
+
+class FusedProcessor(Processor):
+    '''Runs the processes as one compiled plan that renders each output in a single pass over the source.'''
+    def __init__(self, processes: list[Process]) -> None:
+        super().__init__(processes=processes)
+        self.plan = Plan(processes)
+
+    def process(self, data: Data) -> Job:
+        return Job(current=self.plan.run(data))
+
 class LinearProcessor(Processor):
     def process(self, data: Data) -> Job:
         job: Job = Job(changes=[], current=[data])
 
         for proc in self.processes:
             proc.run(job)
-            
-            if len(job.changes) > 0:
-                job.current = [data.copy() for data in job.changes]
-                job.changes.clear()
+            job.process_changes()
 
         return job
 
@@ -41,19 +130,36 @@ class ProcessFactory:
         process_ctx = context.sub('processor')
         process_ctx.logger.info(f'Creating processor')
         processes: list[Process] = []
+        nodes: list[Node] = []
         process_config = process_ctx.config.sub('process')
-        for proc in process_config.dicts('processes'):
-            if proc['process'] == 'crop':
+        for index, proc in enumerate(process_config.dicts('processes')):
+            name = proc.get('name', proc.get('process'))
+            if name == 'crop':
                 processes.append(CropProcess())
-            elif proc['process'] == 'mask':
+            elif name == 'mask':
                 processes.append(MaskProcess())
-            elif proc['process'] == 'rename':
+            elif name == 'rename':
                 processes.append(RenameProcess())
-            elif proc['process'] == 'resize':
+            elif name == 'resize':
                 processes.append(ResizeProcess(dimensions=proc['params']))
+            else:
+                continue
+
+            nodes.append(Node(
+                id=str(proc.get('id', f'{name}{index}')),
+                input=str(proc.get('input', nodes[-1].id if nodes else 'source')),
+                output=proc.get('output'),
+                process=processes[-1],
+            ))
 
         processor: str = process_config.str('processor')
-        if processor == 'linear':
+        if processor == 'dag':
+            process_ctx.logger.info(f'Created DAG processor with {len(nodes)} nodes')
+            return DAGProcessor(nodes=nodes)
+        elif processor == 'linear':
+            if process_config.get('fuse', True) and all(proc.fusable for proc in processes):
+                process_ctx.logger.info(f'Compiled {len(processes)} processes into a fused plan')
+                return FusedProcessor(processes=processes)
             return LinearProcessor(processes=processes)
         else:
             raise Exception(f'unknown processor: {processor}')
\ No newline at end of file
@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field, replace
+import math
+from uuid import uuid4
+
+import cv2
+import numpy as np
+
+from play.data import Data
+
+
+@dataclass
+class Transform:
+    '''
+    Geometry of one output relative to its source image. The region of interest and the
+    mask polygons are normalized, so they can be applied to the source at any resolution.
+    '''
+    source: tuple[int, int]
+
+    masks: list[np.ndarray] = field(default_factory=lambda: [])
+    rename: bool = False
+    roi: tuple[float, float, float, float] = (0.0, 0.0, 1.0, 1.0)
+    size: tuple[int, int] | None = None
+
+    def apply(self, array: np.ndarray) -> np.ndarray:
+        '''Render the output from the source in a single pass: slice, resize, then mask.'''
+        if self.is_identity():
+            return array
+
+        height, width = array.shape[:2]
+        rx1, ry1, rx2, ry2 = self.roi
+        x1, y1 = int(round(rx1 * width)), int(round(ry1 * height))
+        x2, y2 = max(int(round(rx2 * width)), x1 + 1), max(int(round(ry2 * height)), y1 + 1)
+        output = array[y1:y2, x1:x2]
+
+        out_h, out_w = self.frame()
+        if output.shape[:2] != (out_h, out_w):
+            shrinking = out_h * out_w < output.shape[0] * output.shape[1]
+            interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+            output = cv2.resize(output, dsize=(out_w, out_h), interpolation=interpolation)
+
+        for polygon in self.masks:
+            points = np.int32([polygon * np.array([out_w, out_h])])
+            mask = cv2.fillPoly(np.zeros_like(output), pts=points, color=(255,) * 4)
+            output = cv2.bitwise_and(output, mask)
+
+        return output
+
+    def crop(self, x1: float, y1: float, x2: float, y2: float) -> 'Transform':
+        '''Narrow the region to a box normalized to the current output frame.'''
+        x1, x2 = np.clip([x1, x2], 0.0, 1.0)
+        y1, y2 = np.clip([y1, y2], 0.0, 1.0)
+        rx1, ry1, rx2, ry2 = self.roi
+        rw, rh = rx2 - rx1, ry2 - ry1
+
+        size = None
+        if self.size:
+            size = (max(int(round((x2 - x1) * self.size[0])), 1), max(int(round((y2 - y1) * self.size[1])), 1))
+
+        scale = np.array([max(x2 - x1, 1e-9), max(y2 - y1, 1e-9)])
+        masks = [(polygon - np.array([x1, y1])) / scale for polygon in self.masks]
+
+        return replace(
+            self,
+            masks=masks,
+            roi=(rx1 + x1 * rw, ry1 + y1 * rh, rx1 + x2 * rw, ry1 + y2 * rh),
+            size=size,
+        )
+
+    def frame(self) -> tuple[int, int]:
+        '''Current output (height, width) in pixels.'''
+        if self.size:
+            return self.size[1], self.size[0]
+
+        rx1, ry1, rx2, ry2 = self.roi
+        height, width = self.source
+        return max(int(round((ry2 - ry1) * height)), 1), max(int(round((rx2 - rx1) * width)), 1)
+
+    def is_identity(self) -> bool:
+        return self.roi == (0.0, 0.0, 1.0, 1.0) and not self.size and not self.masks
+
+    def resolution(self) -> tuple[int, int] | None:
+        '''Smallest source (width, height) that still renders the output in full, None when it needs the source as is.'''
+        if not self.size:
+            return None
+        rx1, ry1, rx2, ry2 = self.roi
+        return math.ceil(self.size[0] / max(rx2 - rx1, 1e-9)), math.ceil(self.size[1] / max(ry2 - ry1, 1e-9))
+
+
+class Plan:
+    '''Chain of fusable processes compiled into one transform per output.'''
+    def __init__(self, processes: list) -> None:
+        self.processes = processes
+        self.pixels = any(proc.pixels for proc in processes)
+
+    @staticmethod
+    def _resolution(transforms: list[Transform]) -> tuple[int, int] | None:
+        '''Source (width, height) covering every output, so the decode can be reduced to it.'''
+        resolutions = [transform.resolution() for transform in transforms]
+        if not resolutions or None in resolutions:
+            return None
+        return max(width for width, _ in resolutions), max(height for _, height in resolutions)
+
+    def _output(self, data: Data, transform: Transform, content: np.ndarray | None) -> Data:
+        copy: Data = data.copy()
+        if content is not None:
+            copy.image.content = content
+        if transform.rename:
+            copy.name = uuid4().hex
+        return copy
+
+    def resolve(self, data: Data, source: tuple[int, int]) -> list[Transform]:
+        transforms = [Transform(source=source)]
+        for proc in self.processes:
+            transforms = proc.fuse(data, transforms)
+        return transforms
+
+    def run(self, data: Data) -> list[Data]:
+        if not self.pixels or not data.image:
+            return [self._output(data, transform, None) for transform in self.resolve(data, (0, 0))]
+
+        # geometry is resolved against the full source, then applied to pixels decoded only as large as needed
+        shape = data.image.shape()
+        if shape is None:
+            data.image.load()
+            shape = data.image.content.shape[:2]
+        transforms = self.resolve(data, shape)
+        image = data.image.copy()  # decode into a copy: other consumers of the source need it at full size
+        image.load(self._resolution(transforms))
+
+        content = image.content
+        return [self._output(data, t, t.apply(content)) for t in transforms]
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from dataclasses import replace
 from uuid import uuid4
 
 import numpy as np
@@ -6,25 +7,52 @@ import numpy as np
 from play.data import Bbox, Data, Points2D
 
 from .job import Job
+from .plan import Transform
 from ..utils import ImageUtils
 
 
 class Process(ABC):
+    fusable: bool = False
+    pixels: bool = True
+
+    def fuse(self, data: Data, transforms: list[Transform]) -> list[Transform]:
+        '''Compose this process into the output transforms of a fused plan.'''
+        raise NotImplementedError
+
+    def resolution(self, shape: tuple[int, int]) -> tuple[int, int] | None:
+        '''Smallest (width, height) of a source of shape (height, width) this process needs, None for the source as is.'''
+        return None
+
     @abstractmethod
     def run(self, job: Job) -> None:
         NotImplemented
 
 class CropProcess(Process):
+    fusable = True
+
+    def fuse(self, data: Data, transforms: list[Transform]) -> list[Transform]:
+        if data.annotations is None or not data.annotations.has_box().any():
+            return transforms  # nothing to crop: the sample passes through, as in run
+
+        annotations = data.annotations.copy()
+        annotations.select(annotations.has_box())
+        annotations.to_xyxy()
+        corners = annotations.boxes.tolist()
+        return [transform.crop(*corner) for transform in transforms for corner in corners]
+
     def run(self, job: Job) -> None:
         for data in job.current:
+            if data.annotations is None:
+                continue
+            data.image.load()
             for anno in data.annotations.items:
                 if not anno.bbox:
                     continue
 
                 bbox: Bbox = anno.bbox
                 copy: Data = data.copy()
-                height: int = copy.image.content.shape[1]
-                width: int = copy.image.content.shape[0]
+                height: int = copy.image.content.shape[0]
+                width: int = copy.image.content.shape[1]
 
                 bbox.denormalize(height, width)
                 bbox.to_xyxy()
@@ -34,16 +62,33 @@ class CropProcess(Process):
                 job.changes.append(copy)
 
 class MaskProcess(Process):
+    fusable = True
+
+    def fuse(self, data: Data, transforms: list[Transform]) -> list[Transform]:
+        annotations = data.annotations
+        if annotations is None or not annotations.has_points().any():
+            return transforms  # nothing to mask: the sample passes through, as in run
+
+        offsets = annotations.offsets
+        polygons = [
+            annotations.points[offsets[index]:offsets[index + 1]].reshape(-1, 2)
+            for index in np.flatnonzero(annotations.has_points())
+        ]
+        return [replace(transform, masks=transform.masks + [polygon]) for transform in transforms for polygon in polygons]
+
     def run(self, job: Job) -> None:
         for data in job.current:
+            if data.annotations is None:
+                continue
+            data.image.load()
             for anno in data.annotations.items:
-                if not anno.points.size:
+                if not anno.points:
                     continue
                 
                 copy: Data = data.copy()
-                height: int = copy.image.content.shape[1]
+                height: int = copy.image.content.shape[0]
                 points: Points2D = anno.points
-                width: int = copy.image.content.shape[0]
+                width: int = copy.image.content.shape[1]
 
                 points.denormalize(height, width)
                 mask: np.ndarray = points.to_mask(copy.image.content)
@@ -51,6 +96,12 @@ class MaskProcess(Process):
                 job.changes.append(copy)
 
 class RenameProcess(Process):
+    fusable = True
+    pixels = False
+
+    def fuse(self, data: Data, transforms: list[Transform]) -> list[Transform]:
+        return [replace(transform, rename=True) for transform in transforms]
+
     def run(self, job: Job) -> None:
         for data in job.current:
             copy: Data = data.copy()
@@ -59,13 +110,28 @@ class RenameProcess(Process):
 
 class ResizeProcess(Process):
     dimensions: list[int]
+    fusable = True
 
     def __init__(self, dimensions: list[int]):
         super().__init__()
         self.dimensions = dimensions
 
+    def fuse(self, data: Data, transforms: list[Transform]) -> list[Transform]:
+        fused: list[Transform] = []
+        for transform in transforms:
+            width, height = ImageUtils.resize_shape(transform.frame(), self.dimensions)
+            fused.append(replace(transform, size=(width, height)))
+        return fused
+
+    def resolution(self, shape: tuple[int, int]) -> tuple[int, int] | None:
+        width, height = ImageUtils.resize_shape(shape, self.dimensions)
+        return width, height
+
     def run(self, job: Job) -> None:
         for data in job.current:
+            shape = data.image.shape()
+            size = ImageUtils.resize_shape(shape, self.dimensions) if shape else None
             copy: Data = data.copy()
-            copy.image.content = ImageUtils.resize(array=copy.image.content, size=self.dimensions)
+            copy.image.load(size)  # reduced pixels stay in the copy, the shared source is left as it is
+            copy.image.content = ImageUtils.resize(array=copy.image.content, size=size or self.dimensions)
             job.changes.append(copy)
\ No newline at end of file
@@ -1,6 +1,10 @@
 from .download import Downloader
+from .encoder import Encoder
 from .image import ImageUtils
-from .storage import Storage, StorageFactory
+from .labels import LabelCache
+from .manifest import Manifest
+from .storage import LocalStorage, PackedStorage, ShardStorage, SQLiteStorage, Storage, StorageFactory
+from .writer import WriteBehind
 
 
-__all__ = ('Downloader', 'ImageUtils', 'Storage', 'StorageFactory')
\ No newline at end of file
+__all__ = ('Downloader', 'Encoder', 'ImageUtils', 'LabelCache', 'LocalStorage', 'Manifest', 'PackedStorage', 'ShardStorage', 'SQLiteStorage', 'Storage', 'StorageFactory', 'WriteBehind')
\ No newline at end of file
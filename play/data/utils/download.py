@@ -1,24 +1,199 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import os
 from pathlib import Path
+import sqlite3
+from threading import Lock, Semaphore, get_ident
+import time
 from urllib.parse import ParseResult, urlparse
-import urllib.request
+
+import requests
+from requests.adapters import HTTPAdapter
 
 
 class Downloader:
-    def __init__(self, path: Path = Path('.projects/cache')):
-        self.path = path
+    '''
+    Concurrent downloader with a content-addressed cache. Requests share a pooled
+    keep-alive session, are limited to `per_host` at a time per host and are retried
+    with exponential backoff. Content is stored once under objects/<sha256>, and each
+    URL gets a hardlinked view that keeps its file name. Once the cache holds more than
+    `max_bytes`, the least recently used objects are evicted. Content fetched into
+    memory is written to the cache only when `write_through` is set. A configured
+    `session` (a stand-in server, proxies, auth) is used as given instead of the pooled one.
+    '''
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        path: Path = Path('.projects/cache'),
+        backoff: float = 0.5,
+        max_bytes: int | None = None,
+        per_host: int = 4,
+        retries: int = 3,
+        session: requests.Session | None = None,
+        timeout: float = 30.0,
+        workers: int = 16,
+        write_through: bool = True,
+    ) -> None:
+        self.path = Path(path)
         self.path.mkdir(exist_ok=True, parents=True)
+        self.backoff = backoff
+        self.max_bytes = max_bytes
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+        self.workers = workers
+        self.write_through = write_through
+
+        self.session = session or requests.Session()
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=0)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+        self.hosts: dict[str, Semaphore] = {}
+        self.lock = Lock()
+        self.pool: ThreadPoolExecutor | None = None
+
+        self.conn = sqlite3.connect(self.path.joinpath('cache.sqlite'), check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER, used REAL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS refs (url TEXT PRIMARY KEY, digest TEXT, view TEXT)')
+        self.conn.commit()
+
+    def _cached(self, url: str) -> tuple[Path, Path] | None:
+        '''Return (view, object) for a cached url, marking it as recently used.'''
+        with self.lock:
+            row = self.conn.execute('SELECT digest, view FROM refs WHERE url = ?', (url,)).fetchone()
+            if not row:
+                return None
+            view, blob = Path(row[1]), self._object(row[0])
+            if not view.exists() or not blob.exists():
+                self.conn.execute('DELETE FROM refs WHERE url = ?', (url,))
+                self.conn.commit()
+                return None
+            self.conn.execute('UPDATE objects SET used = ? WHERE digest = ?', (time.time(), row[0]))
+            self.conn.commit()
+        return view, blob
+
+    def _evict(self, keep: str) -> None:
+        '''Drop least recently used objects, except keep, until the cache fits in max_bytes.'''
+        if self.max_bytes is None:
+            return
+
+        with self.lock:
+            total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            for digest, size in self.conn.execute('SELECT digest, size FROM objects ORDER BY used').fetchall():
+                if total <= self.max_bytes:
+                    break
+                if digest == keep:
+                    continue
+                for (view,) in self.conn.execute('SELECT view FROM refs WHERE digest = ?', (digest,)).fetchall():
+                    Path(view).unlink(missing_ok=True)
+                self._object(digest).unlink(missing_ok=True)
+                self.conn.execute('DELETE FROM refs WHERE digest = ?', (digest,))
+                self.conn.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+                total -= size
+            self.conn.commit()
+
+    def _get(self, url: str) -> bytes:
+        '''GET with a per-host limit, retrying connection errors and retryable statuses.'''
+        host = urlparse(url).netloc
+        with self.lock:
+            limit = self.hosts.setdefault(host, Semaphore(self.per_host))
+
+        for attempt in range(self.retries + 1):
+            try:
+                with limit:
+                    response = self.session.get(url, timeout=self.timeout)
+                if response.status_code not in self.RETRY_STATUS:
+                    response.raise_for_status()
+                    return response.content
+                error: Exception = requests.HTTPError(f'{response.status_code} for url: {url}', response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+    def _object(self, digest: str) -> Path:
+        return self.path.joinpath('objects', digest[:2], digest)
+
+    def _store(self, url: str, content: bytes) -> Path:
+        '''Write content once by digest and link a named view of it for url.'''
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self._object(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True, parents=True)
+            temp = blob.with_name(f'{digest}.{os.getpid()}.{get_ident()}.tmp')
+            temp.write_bytes(content)
+            try:
+                os.link(temp, blob)  # the first writer wins, so views never point at a replaced object
+            except FileExistsError:
+                pass
+            except OSError:
+                os.replace(temp, blob)
+            temp.unlink(missing_ok=True)
 
-    def download(self, url: str) -> Path:
         name, suffix = self.parser_url(url)
-        path: Path = self.path.joinpath(f'{name}.{suffix}')
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+        view = self.path.joinpath('files', key, f'{name}.{suffix}')
+        if not view.exists():
+            view.parent.mkdir(exist_ok=True, parents=True)
+            try:
+                os.link(blob, view)
+            except OSError:
+                view.write_bytes(content)
+
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO objects VALUES (?, ?, ?)', (digest, len(content), time.time()))
+            self.conn.execute('INSERT OR REPLACE INTO refs VALUES (?, ?, ?)', (url, digest, str(view)))
+            self.conn.commit()
+
+        self._evict(keep=digest)
+        return view
+
+    def close(self) -> None:
+        if self.pool:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        self.session.close()
+        with self.lock:
+            self.conn.close()
+
+    def download(self, url: str) -> Path:
+        '''Return a local path for url, downloading it unless it is cached.'''
+        cached = self._cached(url)
+        if cached:
+            return cached[0]
+        return self._store(url, self._get(url))
+
+    def download_many(self, urls: list[str]) -> list[Path]:
+        '''Download urls concurrently and return their paths in the same order.'''
+        return [future.result() for future in [self.submit(url) for url in urls]]
+
+    def fetch(self, url: str) -> bytes:
+        '''Return the content of url, from the cache when present.'''
+        cached = self._cached(url)
+        if cached:
+            return cached[1].read_bytes()
+        content = self._get(url)
+        if self.write_through:
+            self._store(url, content)
+        return content
 
-        if not path.exists():
-            urllib.request.urlretrieve(url, str(path))
-        
-        return path
-    
     def parser_url(self, url: str) -> tuple[str, str]:
         url: ParseResult = urlparse(url=url)
         image: str = url.path.split('/')[-1]
         name, suffix = image.split('.')[:2]
-        return (name, suffix)
\ No newline at end of file
+        return (name, suffix)
+
+    def submit(self, url: str, content: bool = False) -> Future:
+        '''Schedule a download on the shared worker pool; the future holds the bytes when content is set.'''
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download')
+        return self.pool.submit(self.fetch if content else self.download, url)
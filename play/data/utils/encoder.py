@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import cv2
+import numpy as np
+
+from play.data import Encoding, Image
+
+
+class Encoder:
+    '''Encodes batches of images on a thread pool; OpenCV releases the GIL while encoding.'''
+    def __init__(self, workers: int = 4) -> None:
+        self.workers = max(workers, 1)
+        self.pool: ThreadPoolExecutor | None = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='encode')
+        return self.pool
+
+    def close(self) -> None:
+        if self.pool:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def encode(self, images: list[tuple[Image, Encoding | None]]) -> None:
+        '''Encode every image into its buffer with its settings; untouched images keep their source.'''
+        if self.workers == 1 or len(images) <= 1:
+            for image, encoding in images:
+                image.encode(encoding)
+            return
+
+        for future in [self._pool().submit(image.encode, encoding) for image, encoding in images]:
+            future.result()
+
+    @staticmethod
+    def benchmark(arrays: list[np.ndarray], settings: dict[str, Encoding], workers: int = 4) -> list[dict]:
+        '''Encode the same arrays with each setting, reporting wall time and bytes produced.'''
+        def encode(array: np.ndarray, suffix: str, params: list[int]) -> int:
+            success, encoded = cv2.imencode(suffix, array, params)
+            return encoded.nbytes if success else 0
+
+        results: list[dict] = []
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            for name, encoding in settings.items():
+                suffix = encoding.suffix('.jpg')
+                params = encoding.params(suffix)
+                start = perf_counter()
+                size = sum(pool.map(lambda array: encode(array, suffix, params), arrays))
+                elapsed = perf_counter() - start
+                results.append({
+                    'bytes': size,
+                    'images_per_second': round(len(arrays) / elapsed, 1) if elapsed else 0.0,
+                    'name': name,
+                    'seconds': round(elapsed, 4),
+                })
+        return results
@@ -79,33 +79,39 @@ class ImageUtils:
     @staticmethod
     def resize(array: np.ndarray, size: int | list[int], multiple: int | None = 32) -> np.ndarray:
         if not array.size == 0:
-            proportional = False
-
-            if isinstance(size, int):
-                proportional = True
-            elif len(size) == 1:
-                size = size[0]
-                proportional = True
-            
-            if not proportional:
-                dsize = size
+            dsize = ImageUtils.resize_shape(array.shape[:2], size, multiple)
+            return cv2.resize(array, dsize=dsize, interpolation=cv2.INTER_AREA)
+
+    @staticmethod
+    def resize_shape(shape: tuple[int, int], size: int | list[int], multiple: int | None = 32) -> list[int]:
+        '''Target (width, height) used by resize for an image of shape (height, width).'''
+        proportional = False
+
+        if isinstance(size, int):
+            proportional = True
+        elif len(size) == 1:
+            size = size[0]
+            proportional = True
+        
+        if not proportional:
+            dsize = list(size)
+        else:
+            shape = tuple(shape) # h,w
+            if shape[0] == shape[1]:
+                dsize = [size, size]
             else:
-                shape = array.shape[:2] # h,w
-                if shape[0] == shape[1]:
-                    dsize = [size, size]
-                else:
-                    max_idx = shape.index(max(shape))
-                    min_idx = shape.index(min(shape))
+                max_idx = shape.index(max(shape))
+                min_idx = shape.index(min(shape))
 
-                    proportion_factor = size/shape[max_idx]
-                    dsize = [0,0]
-                    dsize[min_idx] = size
-                    dsize[max_idx] = int(proportion_factor * shape[min_idx])
+                proportion_factor = size/shape[max_idx]
+                dsize = [0,0]
+                dsize[min_idx] = size
+                dsize[max_idx] = int(proportion_factor * shape[min_idx])
 
-            if multiple:
-                dsize = [max(math.ceil(x / multiple) * multiple, 0) for x in dsize]
+        if multiple:
+            dsize = [max(math.ceil(x / multiple) * multiple, 0) for x in dsize]
 
-            return cv2.resize(array, dsize=dsize, interpolation=cv2.INTER_AREA)
+        return dsize
 
     @staticmethod
     def rotate(array: np.ndarray, angle: int) -> np.ndarray:
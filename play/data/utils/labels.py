@@ -0,0 +1,145 @@
+import json
+import os
+from pathlib import Path
+import struct
+
+import numpy as np
+
+from play.data import Annotations
+
+
+_MAGIC = b'PLAYLBL1'
+_ALIGN = 64
+_COLUMNS = ('class_ids', 'boxes', 'orientations', 'points')
+
+
+class LabelCache:
+    '''
+    Binary cache of the parsed label files of one directory, stored next to it as
+    `<directory>.cache`. The file is a JSON header followed by aligned raw arrays that are
+    memory mapped on open, so warm loads only slice views. Entries are validated against
+    the label file mtime and size; stale or missing ones are parsed and the cache is
+    rewritten on save.
+    '''
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.path = self.directory.parent.joinpath(f'{self.directory.name}.cache')
+
+        self.arrays: dict[str, np.ndarray] = {}
+        self.index: dict[str, int] = {}
+        self.entries: dict[str, tuple[int, int, tuple[np.ndarray, ...]]] = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if self.path.exists():
+            try:
+                self._open()
+            except (OSError, ValueError, KeyError):
+                self.arrays, self.index = {}, {}
+
+    def _open(self) -> None:
+        with open(self.path, 'rb') as file:
+            magic, length = file.read(len(_MAGIC)), struct.unpack('<Q', file.read(8))[0]
+            if magic != _MAGIC:
+                raise ValueError(f'Not a label cache: {self.path}')
+            header = json.loads(file.read(length))
+
+        for name, (offset, dtype, shape) in header['arrays'].items():
+            if not np.prod(shape):
+                self.arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+            self.arrays[name] = np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+        self.index = {name: index for index, name in enumerate(header['names'])}
+
+    def _slice(self, index: int) -> tuple[np.ndarray, ...]:
+        rows, offsets = self.arrays['rows'], self.arrays['offsets']
+        start, end = int(rows[index]), int(rows[index + 1])
+        first, last = int(offsets[start]), int(offsets[end])
+        return (
+            self.arrays['class_ids'][start:end],
+            self.arrays['boxes'][start:end],
+            self.arrays['orientations'][start:end],
+            self.arrays['points'][first:last],
+            np.asarray(offsets[start:end + 1]) - first,
+        )
+
+    def get(self, annotations: Annotations) -> bool:
+        '''Fill annotations from the cache; False when the entry is missing or stale.'''
+        path = self.directory.joinpath(f'{annotations.name}{annotations.suffix}')
+        stat = path.stat()
+        index = self.index.get(annotations.name)
+        if index is None or (stat.st_mtime_ns, stat.st_size) != (
+            int(self.arrays['mtimes'][index]), int(self.arrays['sizes'][index])
+        ):
+            self.misses += 1
+            return False
+
+        columns = self._slice(index)
+        annotations.assign(*columns)
+        annotations.shared = True  # read-only views: copy before any change
+        self.entries[annotations.name] = (stat.st_mtime_ns, stat.st_size, columns)
+        self.hits += 1
+        return True
+
+    def load(self, annotations: Annotations) -> None:
+        '''Load annotations through the cache, parsing the label file on a miss.'''
+        if self.get(annotations):
+            return
+
+        annotations.load()
+        stat = self.directory.joinpath(f'{annotations.name}{annotations.suffix}').stat()
+        columns = (
+            annotations.class_ids, annotations.boxes, annotations.orientations,
+            annotations.points, annotations.offsets,
+        )
+        self.entries[annotations.name] = (stat.st_mtime_ns, stat.st_size, columns)
+        self.dirty = True
+
+    def save(self) -> None:
+        '''Rewrite the cache with the entries seen since it was opened, if any changed.'''
+        if not self.dirty and len(self.entries) == len(self.index):
+            return
+
+        names = list(self.entries)
+        columns = [self.entries[name][2] for name in names]
+        counts = np.array([len(column[0]) for column in columns], dtype=np.int64)
+        point_counts = np.array([len(column[3]) for column in columns], dtype=np.int64)
+        point_starts = np.concatenate([[0], np.cumsum(point_counts)[:-1]]).astype(np.int64)
+
+        arrays: dict[str, np.ndarray] = {
+            'mtimes': np.array([self.entries[name][0] for name in names], dtype=np.int64),
+            'sizes': np.array([self.entries[name][1] for name in names], dtype=np.int64),
+            'rows': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        }
+        for position, key in enumerate(_COLUMNS):
+            parts = [np.asarray(column[position]) for column in columns]
+            arrays[key] = np.concatenate(parts) if parts else np.empty((0,))
+        arrays['class_ids'] = arrays['class_ids'].astype(np.int64)
+        arrays['boxes'] = arrays['boxes'].reshape(-1, 4).astype(np.float64)
+        arrays['orientations'] = arrays['orientations'].astype(np.float64)
+        arrays['points'] = arrays['points'].astype(np.float64)
+        offsets = [np.asarray(column[4][:-1]) + first for column, first in zip(columns, point_starts)]
+        arrays['offsets'] = np.concatenate(offsets + [[int(point_counts.sum())]]).astype(np.int64)
+
+        layout: dict[str, list] = {}
+        position = 0
+        for key, array in arrays.items():
+            layout[key] = [position, array.dtype.str, list(array.shape)]
+            position += -(-array.nbytes // _ALIGN) * _ALIGN
+
+        start, shift = 0, _ALIGN
+        while shift != start:  # the header size depends on the offsets it stores
+            start = shift
+            absolute = {key: [offset + start, dtype, shape] for key, (offset, dtype, shape) in layout.items()}
+            header = json.dumps({'arrays': absolute, 'names': names}).encode('utf-8')
+            shift = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGN) * _ALIGN
+
+        temp = self.path.with_suffix('.cache.tmp')
+        with open(temp, 'wb') as file:
+            file.write(_MAGIC + struct.pack('<Q', len(header)) + header)
+            for key, array in arrays.items():
+                file.seek(absolute[key][0])
+                file.write(np.ascontiguousarray(array).tobytes())
+        os.replace(temp, self.path)
+        self.dirty = False
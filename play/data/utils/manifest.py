@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+from threading import Lock
+from typing import Any
+
+from play.data import Data
+
+
+@dataclass
+class Entry:
+    source: str
+    paths: list[Path]
+    size: int
+    mtime: int
+
+    hash: str | None = None
+
+class Manifest:
+    '''
+    Persisted record of the sources already ingested, keyed by source path. A source is
+    unchanged when size and mtime match, or when its content hash does, under the same
+    processor fingerprint.
+    '''
+    def __init__(self, path: Path, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        self.path = path
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+
+        self.lock = Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'source TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, fingerprint TEXT)'
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def digest(paths: list[Path]) -> str:
+        sha = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as file:
+                sha.update(hashlib.file_digest(file, 'sha256').digest())
+        return sha.hexdigest()
+
+    @staticmethod
+    def fingerprint_of(config: Any) -> str:
+        '''Stable hash of the processing configuration.'''
+        encoded = json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def entry(self, data: Data) -> Entry | None:
+        '''Describe the source files of data, or None when it has no local files to track.'''
+        paths: list[Path] = []
+        if data.image and data.image.parent:
+            paths.append(data.image.path())
+        if data.annotations is not None and data.annotations.parent and data.annotations.suffix:
+            paths.append(Path(data.annotations.parent).joinpath(f'{data.annotations.name}{data.annotations.suffix}'))
+        if data.text and data.text.parent and data.text.suffix:
+            paths.append(Path(data.text.parent).joinpath(f'{data.text.name}{data.text.suffix}'))
+
+        paths = [path for path in paths if path.exists()]
+        if not paths:
+            return None
+
+        stats = [path.stat() for path in paths]
+        return Entry(
+            mtime=max(stat.st_mtime_ns for stat in stats),
+            paths=paths,
+            size=sum(stat.st_size for stat in stats),
+            source=str(paths[0]),
+        )
+
+    def is_current(self, entry: Entry) -> bool:
+        '''
+        True if the entry was already ingested and its content did not change. A source
+        that was only touched gets its new size and mtime stored, so it is not hashed again.
+        '''
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT size, mtime, hash, fingerprint FROM entries WHERE source = ?',
+                (entry.source,),
+            ).fetchone()
+
+        if row and (row[0], row[1]) == (entry.size, entry.mtime):
+            entry.hash = row[2]
+        else:
+            entry.hash = self.digest(entry.paths)
+
+        if not row or row[3] != self.fingerprint or entry.hash != row[2]:
+            return False
+
+        if (row[0], row[1]) != (entry.size, entry.mtime):
+            with self.lock:
+                self.conn.execute(
+                    'UPDATE entries SET size = ?, mtime = ? WHERE source = ?',
+                    (entry.size, entry.mtime, entry.source),
+                )
+                self.conn.commit()
+        return True
+
+    def record(self, entries: list[Entry]) -> None:
+        '''Mark entries as persisted in a single transaction.'''
+        if not entries:
+            return
+
+        rows = [(e.source, e.size, e.mtime, e.hash, self.fingerprint) for e in entries]
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.commit()
+
+    def size(self) -> int:
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
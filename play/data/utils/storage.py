@@ -1,18 +1,78 @@
 from abc import ABC, abstractmethod
+import io
+import json
+import os
 from pathlib import Path
 from shutil import rmtree
+import sqlite3
+import tarfile
+from threading import Lock, local
+import time
+from typing import Generator
+
+import numpy as np
 
 from play.common import Context
-from play.data import Data
+from play.data import Annotations, Data, Encoding, Image, Text
+
+from .encoder import Encoder
+
+
+def _encoded(image: Image, encoding: Encoding | None = None) -> bytes:
+    '''Encoded bytes of an image: its buffer after encoding, its untouched source, or its file.'''
+    image.encode(encoding)
+    if image.buffer is not None:
+        return image.buffer
+    if image.is_pristine() and Path(image.source).exists():
+        return Path(image.source).read_bytes()
+    return image.path().read_bytes()
 
+def _item(
+    key: str,
+    annotations: str | None = None,
+    image: bytes | None = None,
+    suffix: str = '',
+    text: list[str] | None = None,
+) -> Data:
+    '''Rebuild an item from its serialized components, kept in memory without a parent.'''
+    output, _, name = key.rpartition('/')
+    data = Data(name=name, output=output or None)
+    if image is not None:
+        data.image = Image(buffer=image, name=name, parent=None, suffix=suffix)
+    if annotations is not None:
+        data.annotations = Annotations(name=name, parent=None, suffix='.txt')
+        data.annotations.loads(annotations)
+    if text is not None:
+        data.text = Text(content=text, name=name, parent=None, suffix='.txt')
+    return data
+
+def _fsync(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 class Storage(ABC):
-    def __init__(self, context: Context):
+    encodes = True  # False when images are stored as raw pixels
+
+    def __init__(self, context: Context, path: Path | None = None):
         self.context = context
         self.items: dict[str, Data] = {}
-        parent = context.config.path('parent')
-        project = context.config.str('project')
-        self.path = parent.joinpath(project, 'storage')
+        if path is None:
+            parent = context.config.path('parent')
+            project = context.config.str('project')
+            path = parent.joinpath(project, 'storage')
+        self.path = path
+        self.options: dict = context.config.get('storage') or {}
+        self.fsync: bool = self.options.get('fsync', False)
+
+        encoding: dict = context.config.get('encoding') or {}
+        settings = {key: value for key, value in encoding.items() if key not in ('outputs', 'workers')}
+        self.encoder = Encoder(workers=encoding.get('workers', 4))
+        self.encodings: dict[str | None, Encoding | None] = {None: Encoding(**settings) if settings else None}
+        for output, options in (encoding.get('outputs') or {}).items():
+            self.encodings[output] = Encoding(**{**settings, **options})
 
     @abstractmethod
     def add(self, data: Data | list[Data]) -> None:
@@ -26,10 +86,22 @@ class Storage(ABC):
     def clear(self, data: Data | list[Data]) -> None:
         NotImplemented
 
+    def close(self) -> None:
+        '''Release open files; items written so far stay readable.'''
+        self.encoder.close()
+
+    def encoding(self, output: str | None) -> Encoding | None:
+        '''Encoder settings of an output, falling back to the default ones.'''
+        return self.encodings.get(output, self.encodings[None])
+
     @abstractmethod
     def get(self, name: str) -> Data:
         NotImplemented
 
+    def key(self, data: Data) -> str:
+        '''Item key: the data name, prefixed by its output when it has one.'''
+        return f'{data.output}/{data.name}' if data.output else data.name
+
     @abstractmethod
     def save(self) -> None:
         NotImplemented
@@ -42,14 +114,61 @@ class Storage(ABC):
         rmtree(self.path, ignore_errors=True, onexc=None)
         self.path.mkdir(exist_ok=True, parents=True)
 
+    def sync(self) -> None:
+        '''Flush written items to stable storage.'''
+        pass
+
     @abstractmethod
     def unset(self, name: str) -> None:
         NotImplemented
 
+    @abstractmethod
+    def write(self, data: Data) -> None:
+        '''Persist a single item right away, without adding it to the storage items.'''
+        NotImplemented
+
+    def write_many(self, items: list[Data]) -> None:
+        '''Persist several items right away; backends with transactions write them in one.'''
+        for data in items:
+            self.write(data)
+
 
 class LocalStorage(Storage):
-    def __init__(self, context: Context) -> None:
-        super().__init__(context)
+    def __init__(self, context: Context, path: Path | None = None) -> None:
+        super().__init__(context, path)
+        self.dirs: dict[str | None, dict[str, Path]] = {}
+
+    def _dirs(self, output: str | None = None) -> dict[str, Path]:
+        '''Component directories of an output, created on first use.'''
+        if output in self.dirs:
+            return self.dirs[output]
+
+        path = self.path.joinpath(output) if output else self.path
+        dirs = {
+            'annotations': path.joinpath('annotations'),
+            'images': path.joinpath('images'),
+            'texts': path.joinpath('texts'),
+        }
+        for dir_path in dirs.values():
+            dir_path.mkdir(parents=True, exist_ok=True)
+        self.dirs[output] = dirs
+        return dirs
+
+    def _write(self, data: Data) -> None:
+        dirs = self._dirs(data.output)
+        if data.annotations is not None:
+            data.annotations.parent = dirs['annotations']
+        if data.image:
+            data.image.parent = dirs['images']
+        if data.text:
+            data.text.parent = dirs['texts']
+        data.save(self.options.get('transfer', 'copy'), self.encoding(data.output))
+
+        if self.fsync:
+            for component in (data.annotations, data.image, data.text):
+                path = component.parent.joinpath(f'{data.name}{component.suffix}') if component is not None else None
+                if path and path.exists():
+                    _fsync(path)
 
     def add(self, data: Data | list[Data]) -> None:
         if isinstance(data, Data):
@@ -57,7 +176,7 @@ class LocalStorage(Storage):
         elif isinstance(data, list) and data and isinstance(data[0], list):
             data = [d for sublist in data for d in sublist]
         
-        self.items.update({d.name: d for d in data})
+        self.items.update({self.key(d): d for d in data})
 
     def all(self) -> list[Data]:
         return list(self.items.values())
@@ -71,22 +190,12 @@ class LocalStorage(Storage):
         return self.items.get(name)
 
     def save(self) -> None:
-        dirs = {
-            'annotations': self.path.joinpath('annotations'),
-            'images': self.path.joinpath('images'),
-            'texts': self.path.joinpath('texts'),
-        }
-        for dir_path in dirs.values():
-            dir_path.mkdir(parents=True, exist_ok=True)
-
-        for data in self.items.values():
-            if data.annotations:
-                data.annotations.parent = self.path.joinpath('annotations')
-            if data.image:
-                data.image.parent = self.path.joinpath('images')
-            if data.text:
-                data.text.parent = self.path.joinpath('texts')  
-            data.save()
+        '''Encode the images of all items in parallel, then write them.'''
+        items = list(self.items.values())
+        if self.encodes:
+            self.encoder.encode([(d.image, self.encoding(d.output)) for d in items if d.image])
+        for data in items:
+            self._write(data)
 
     def set(self, name: str, data: Data) -> None:
         self.items[name] = data
@@ -97,8 +206,408 @@ class LocalStorage(Storage):
     def unset(self, name: str) -> None:
         self.items.pop(name, None)
 
+    def write(self, data: Data) -> None:
+        self._write(data)
+
+class PackedStorage(LocalStorage):
+    '''
+    Keeps decoded pixels of all items in one packed.bin file, appended at 64-byte aligned
+    offsets, with a packed.jsonl index holding offset, shape, dtype, labels and texts.
+    Read images are zero-copy views into a read-only memory map, so processes reading
+    the same store share the page cache instead of decoding private copies.
+    '''
+    ALIGN = 64
+    encodes = False
+
+    def __init__(self, context: Context, path: Path | None = None) -> None:
+        super().__init__(context, path)
+        self.bin = self.path.joinpath('packed.bin')
+        self.jsonl = self.path.joinpath('packed.jsonl')
+
+        self.lock = Lock()
+        self.index: dict[str, dict] = {}
+        self.map: np.memmap | None = None
+        self.file = None
+        self.sidecar = None
+        if self.jsonl.exists():
+            with open(self.jsonl, 'r', encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.index[record['key']] = record
+
+    def _data(self, record: dict) -> Data:
+        output, _, name = record['key'].rpartition('/')
+        data = Data(name=name, output=output or None)
+        if record.get('shape'):
+            data.image = Image(
+                content=self._view(record['offset'], record['shape'], record.get('dtype', 'uint8')),
+                name=name,
+                parent=None,
+                shared=True,  # read-only view: copy before writing pixels
+                suffix=record['suffix'],
+            )
+        if record.get('annotations') is not None:
+            data.annotations = Annotations(name=name, parent=None, suffix='.txt')
+            data.annotations.loads(record['annotations'])
+        if record.get('text') is not None:
+            data.text = Text(content=record['text'], name=name, parent=None, suffix='.txt')
+        return data
+
+    def _view(self, offset: int, shape: list[int], dtype: str = 'uint8') -> np.ndarray:
+        dtype = np.dtype(dtype)
+        end = offset + int(np.prod(shape)) * dtype.itemsize
+        if self.map is None or len(self.map) < end:
+            if self.file:
+                self.file.flush()
+            self.map = np.memmap(self.bin, dtype=np.uint8, mode='r')
+        return self.map[offset:end].view(dtype).reshape(shape)
+
+    def _write(self, data: Data) -> None:
+        record: dict = {'key': self.key(data)}
+        pixels = None
+        if data.image:
+            data.image.load()
+            if not data.image.is_empty():
+                pixels = np.ascontiguousarray(data.image.content)  # 16-bit png/tiff keep their depth
+                record.update(dtype=pixels.dtype.str, shape=list(pixels.shape), suffix=data.image.suffix)
+        if data.annotations is not None:
+            data.annotations.load()
+            record['annotations'] = data.annotations.dumps()
+        if data.text and data.text.content:
+            record['text'] = list(data.text.content)
+
+        with self.lock:
+            if self.file is None:
+                self.path.mkdir(exist_ok=True, parents=True)
+                self.file = open(self.bin, 'ab')
+                self.sidecar = open(self.jsonl, 'a', encoding='utf-8')
+            if pixels is not None:
+                offset = -(-self.file.tell() // self.ALIGN) * self.ALIGN
+                self.file.write(bytes(offset - self.file.tell()))
+                self.file.write(pixels.data)
+                record['offset'] = offset
+            self.sidecar.write(json.dumps(record) + '\n')
+            self.sidecar.flush()
+            self.index[record['key']] = record
+
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.sidecar.close()
+            self.file, self.sidecar = None, None
+
+    def get(self, name: str) -> Data | None:
+        '''Item by key, from the pending items or as views into the packed file.'''
+        if name in self.items:
+            return self.items[name]
+        if name not in self.index:
+            return None
+        return self._data(self.index[name])
+
+    def iterate(self) -> Generator[Data, None, None]:
+        '''Yield every stored item in write order.'''
+        for record in list(self.index.values()):
+            yield self._data(record)
+
+    def sync(self) -> None:
+        with self.lock:
+            for file in (self.file, self.sidecar):
+                if file:
+                    file.flush()
+                    os.fsync(file.fileno())
+
+    def setup(self):
+        self.close()
+        self.index.clear()
+        self.map = None
+        return super().setup()
+
+class ShardStorage(LocalStorage):
+    '''
+    Packs items into sequentially written tar shards of about `shard_size` bytes. Each
+    shard-<n>.tar has a shard-<n>.jsonl sidecar with one line per item, holding the data
+    offset and size of every member, so an item can be read back by key with one seek.
+    Members are named <key><image suffix>, <key>.txt (annotations) and <key>.text.
+    '''
+    def __init__(self, context: Context, path: Path | None = None) -> None:
+        super().__init__(context, path)
+        self.shard_size: int = self.options.get('shard_size', 1 << 30)
+
+        self.lock = Lock()
+        self.index: dict[str, tuple[int, dict[str, list]]] = {}
+        self.shards: list[Path] = sorted(self.path.glob('shard-*.tar')) if self.path.exists() else []
+        self.sidecar = None
+        self.tar: tarfile.TarFile | None = None
+        for number, shard in enumerate(self.shards):
+            for key, entry in self._entries(shard):
+                self.index[key] = (number, entry)
+
+    def _close_shard(self) -> None:
+        if self.tar is None:
+            return
+        if self.fsync:
+            for file in (self.tar.fileobj, self.sidecar):
+                file.flush()
+                os.fsync(file.fileno())
+        self.tar.close()
+        self.sidecar.close()
+        self.tar, self.sidecar = None, None
+
+    def _data(self, key: str, payloads: dict[str, tuple[str, bytes]]) -> Data:
+        image, annotations, text = payloads.get('image'), payloads.get('annotations'), payloads.get('text')
+        return _item(
+            key,
+            annotations=annotations[1].decode('utf-8') if annotations else None,
+            image=image[1] if image else None,
+            suffix=Path(image[0]).suffix if image else '',
+            text=text[1].decode('utf-8').splitlines() if text else None,
+        )
+
+    def _entries(self, shard: Path) -> Generator[tuple[str, dict[str, list]], None, None]:
+        sidecar = shard.with_suffix('.jsonl')
+        if not sidecar.exists():
+            return
+        with open(sidecar, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record['key'], record['members']
+
+    def _members(self, key: str, data: Data) -> list[tuple[str, str, bytes]]:
+        '''Serialize the components of data as (component, member name, payload).'''
+        members: list[tuple[str, str, bytes]] = []
+        if data.image:
+            payload = _encoded(data.image, self.encoding(data.output))
+            members.append(('image', f'{key}{data.image.suffix}', payload))
+        if data.annotations is not None:
+            data.annotations.load()
+            members.append(('annotations', f'{key}.txt', data.annotations.dumps().encode('utf-8')))
+        if data.text and data.text.content:
+            members.append(('text', f'{key}.text', '\n'.join(data.text.content).encode('utf-8')))
+        return members
+
+    def _open_shard(self) -> None:
+        self.path.mkdir(exist_ok=True, parents=True)
+        shard = self.path.joinpath(f'shard-{len(self.shards):06d}.tar')
+        self.shards.append(shard)
+        self.tar = tarfile.open(shard, 'w', format=tarfile.GNU_FORMAT)
+        self.sidecar = open(shard.with_suffix('.jsonl'), 'w', encoding='utf-8')
+
+    def _write(self, data: Data) -> None:
+        key = self.key(data)
+        members = self._members(key, data)
+        with self.lock:
+            if self.tar is None:
+                self._open_shard()
+
+            entry: dict[str, list] = {}
+            for component, member, payload in members:
+                info = tarfile.TarInfo(member)
+                info.mtime = int(time.time())
+                info.size = len(payload)
+                self.tar.addfile(info, io.BytesIO(payload))
+                padded = -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                entry[component] = [member, self.tar.offset - padded, info.size]
+
+            self.tar.fileobj.flush()  # readers open the shard through their own handle
+            self.sidecar.write(json.dumps({'key': key, 'members': entry}) + '\n')
+            self.sidecar.flush()
+            self.index[key] = (len(self.shards) - 1, entry)
+            if self.tar.offset >= self.shard_size:
+                self._close_shard()
+
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            self._close_shard()
+
+    def get(self, name: str) -> Data | None:
+        '''Item by key, from the pending items or read back from its shard.'''
+        if name in self.items:
+            return self.items[name]
+        if name not in self.index:
+            return None
+
+        number, entry = self.index[name]
+        payloads: dict[str, tuple[str, bytes]] = {}
+        with open(self.shards[number], 'rb') as file:
+            for component, (member, offset, size) in entry.items():
+                file.seek(offset)
+                payloads[component] = (member, file.read(size))
+        return self._data(name, payloads)
+
+    def iterate(self) -> Generator[Data, None, None]:
+        '''Stream every stored item shard by shard, reading each shard sequentially.'''
+        for shard in list(self.shards):
+            with open(shard, 'rb') as file:
+                for key, entry in self._entries(shard):
+                    payloads: dict[str, tuple[str, bytes]] = {}
+                    for component, (member, offset, size) in entry.items():
+                        file.seek(offset)
+                        payloads[component] = (member, file.read(size))
+                    yield self._data(key, payloads)
+
+    def sync(self) -> None:
+        with self.lock:
+            if self.tar is not None:
+                for file in (self.tar.fileobj, self.sidecar):
+                    file.flush()
+                    os.fsync(file.fileno())
+
+    def setup(self):
+        self.close()
+        self.index.clear()
+        self.shards.clear()
+        return super().setup()
+
+class SQLiteStorage(Storage):
+    '''
+    Items in an SQLite database (items.sqlite) in WAL mode, so readers run concurrently
+    with the writer. Added items stay in memory until save(), which writes them all in
+    one transaction; get() reads single rows by key through a per-thread connection,
+    all of which are closed by close().
+    '''
+    def __init__(self, context: Context, path: Path | None = None) -> None:
+        super().__init__(context, path)
+        self.db = self.path.joinpath('items.sqlite')
+        self.lock = Lock()
+        self.local = local()
+        self.conn: sqlite3.Connection | None = None
+        self.readers: list[sqlite3.Connection] = []
+        self._connect()
+
+    def _connect(self) -> None:
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.conn = sqlite3.connect(self.db, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'PRAGMA synchronous={"FULL" if self.fsync else "NORMAL"}')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS items ('
+            'key TEXT PRIMARY KEY, image BLOB, suffix TEXT, annotations TEXT, text TEXT)'
+        )
+        self.conn.commit()
+        self.local = local()
+
+    def _reader(self) -> sqlite3.Connection:
+        '''Read-only connection of the calling thread.'''
+        if getattr(self.local, 'conn', None) is None:
+            self.local.conn = sqlite3.connect(f'file:{self.db}?mode=ro', uri=True, check_same_thread=False)
+            with self.lock:
+                self.readers.append(self.local.conn)
+        return self.local.conn
+
+    def _row(self, key: str, data: Data) -> tuple:
+        image = _encoded(data.image, self.encoding(data.output)) if data.image else None
+        annotations = None
+        if data.annotations is not None:
+            data.annotations.load()
+            annotations = data.annotations.dumps()
+        text = json.dumps(data.text.content) if data.text and data.text.content else None
+        return (key, image, data.image.suffix if data.image else '', annotations, text)
+
+    def add(self, data: Data | list[Data]) -> None:
+        if isinstance(data, Data):
+            data = [data]
+        elif isinstance(data, list) and data and isinstance(data[0], list):
+            data = [d for sublist in data for d in sublist]
+
+        self.items.update({self.key(d): d for d in data})
+
+    def all(self) -> list[Data]:
+        '''Every stored item followed by the pending ones; loads them all in memory.'''
+        stored = [
+            _item(key, annotations, image, suffix, json.loads(text) if text else None)
+            for key, image, suffix, annotations, text in self._reader().execute(
+                'SELECT key, image, suffix, annotations, text FROM items ORDER BY rowid'
+            )
+            if key not in self.items
+        ]
+        return stored + list(self.items.values())
+
+    def clear(self) -> list[Data]:
+        cleared = list(self.items.values())
+        self.items.clear()
+        return cleared
+
+    def close(self) -> None:
+        super().close()
+        with self.lock:
+            if self.conn:
+                self.conn.close()
+            for reader in self.readers:  # opened by any thread, not only the calling one
+                reader.close()
+            self.conn = None
+            self.readers.clear()
+        self.local = local()
+
+    def get(self, name: str) -> Data | None:
+        if name in self.items:
+            return self.items[name]
+
+        row = self._reader().execute(
+            'SELECT image, suffix, annotations, text FROM items WHERE key = ?', (name,)
+        ).fetchone()
+        if not row:
+            return None
+        image, suffix, annotations, text = row
+        return _item(name, annotations, image, suffix, json.loads(text) if text else None)
+
+    def save(self) -> None:
+        '''Write all pending items in a single transaction.'''
+        self.encoder.encode([(d.image, self.encoding(d.output)) for d in self.items.values() if d.image])
+        rows = [self._row(key, data) for key, data in self.items.items()]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)', rows)
+
+    def set(self, name: str, data: Data) -> None:
+        self.items[name] = data
+
+    def setup(self):
+        self.close()
+        super().setup()
+        self._connect()
+
+    def size(self) -> int:
+        return self._reader().execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def unset(self, name: str) -> None:
+        self.items.pop(name, None)
+        with self.lock:
+            with self.conn:
+                self.conn.execute('DELETE FROM items WHERE key = ?', (name,))
+
+    def write(self, data: Data) -> None:
+        row = self._row(self.key(data), data)
+        with self.lock:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)', row)
+
+    def write_many(self, items: list[Data]) -> None:
+        '''Write the items in a single transaction.'''
+        self.encoder.encode([(d.image, self.encoding(d.output)) for d in items if d.image])
+        rows = [self._row(self.key(data), data) for data in items]
+        with self.lock:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?)', rows)
+
 class StorageFactory:
+    storages: dict[str, type[Storage]] = {
+        'local': LocalStorage,
+        'packed': PackedStorage,
+        'shard': ShardStorage,
+        'sqlite': SQLiteStorage,
+    }
+
     @staticmethod
-    def create(context: Context) -> Storage:
+    def create(context: Context, path: Path | None = None) -> Storage:
         storage_ctx = context.sub('storage')
-        return LocalStorage(storage_ctx)
\ No newline at end of file
+        options = context.config.get('storage') or {}
+        backend = options.get('backend', 'local')
+        if backend in StorageFactory.storages:
+            return StorageFactory.storages[backend](storage_ctx, path)
+        else:
+            raise Exception(f'Storage backend not implemented: {backend}')
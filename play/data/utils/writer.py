@@ -0,0 +1,95 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition
+
+from play.common import Logger
+from play.data import Data
+
+from .storage import Storage
+
+
+class WriteBehind:
+    '''
+    Persists flushed batches on a pool of writer threads while ingestion continues; each
+    batch goes to the storage in one `write_many` call, a single transaction for SQLite.
+    Submitting blocks while the batches in flight hold more than `max_bytes` of pixels.
+    A source counts as persisted only when all of its items were written, and the
+    storage was synced when `fsync` is set.
+    '''
+    def __init__(self, storage: Storage, logger: Logger, workers: int = 4, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.logger = logger
+        self.max_bytes = max_bytes
+        self.storage = storage
+
+        self.cond = Condition()
+        self.done: deque[list[str]] = deque()
+        self.failures = 0
+        self.inflight = 0
+        self.pool = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='write')
+
+    @staticmethod
+    def _size(batch: list[tuple[str, list[Data]]]) -> int:
+        size = 0
+        for _, items in batch:
+            for data in items:
+                if data.image is not None:
+                    size += data.image.content.nbytes + len(data.image.buffer or b'')
+        return size
+
+    def _write(self, batch: list[tuple[str, list[Data]]], size: int) -> None:
+        written: list[str] = []
+        failures = 0
+        try:
+            try:
+                self.storage.write_many([data for _, items in batch for data in items])
+                written = [name for name, _ in batch]
+            except Exception as e:
+                self.logger.warning(f'Failed to write batch, retrying its sources one by one: {type(e).__name__}: {e}')
+                written, failures = self._write_each(batch)
+
+            if self.storage.fsync:
+                try:
+                    self.storage.sync()
+                except OSError as e:
+                    failures += len(written)
+                    written.clear()
+                    self.logger.error(f'Failed to sync storage: {e}')
+        finally:
+            with self.cond:
+                self.done.append(written)
+                self.failures += failures
+                self.inflight -= size
+                self.cond.notify_all()
+
+    def _write_each(self, batch: list[tuple[str, list[Data]]]) -> tuple[list[str], int]:
+        '''Write the sources of a batch separately, so one bad item fails only its own source.'''
+        written: list[str] = []
+        failures = 0
+        for name, items in batch:
+            try:
+                self.storage.write_many(items)
+                written.append(name)
+            except Exception as e:
+                failures += 1
+                self.logger.error(f'Failed to write data {name}: {type(e).__name__}: {e}')
+        return written, failures
+
+    def close(self) -> list[str]:
+        '''Wait for every pending batch and return the names persisted since the last call.'''
+        self.pool.shutdown(wait=True)
+        return self.completed()
+
+    def completed(self) -> list[str]:
+        '''Names of the sources persisted by batches finished since the last call.'''
+        with self.cond:
+            names = [name for written in self.done for name in written]
+            self.done.clear()
+        return names
+
+    def submit(self, batch: list[tuple[str, list[Data]]]) -> None:
+        size = self._size(batch)
+        with self.cond:
+            while self.inflight and self.inflight + size > self.max_bytes:
+                self.cond.wait()
+            self.inflight += size
+        self.pool.submit(self._write, batch, size)
@@ -1,5 +1,5 @@
-from .dataset import Dataset
+from .dataset import Dataset, ExportStats
 from .factory import DatasetFactory
 
 
-__all__ = ('Dataset', 'DatasetFactory')
\ No newline at end of file
+__all__ = ('Dataset', 'DatasetFactory', 'ExportStats')
\ No newline at end of file
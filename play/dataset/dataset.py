@@ -1,12 +1,33 @@
 from abc import abstractmethod
-import math
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
 from shutil import rmtree
+from time import perf_counter
+from typing import Iterable
+
+import numpy as np
+from tqdm import tqdm
 
 from play.common import Config, TaskType
 from play.data import Data
 
 
+@dataclass
+class ExportStats:
+    '''Outcome of an export: the samples written, the failures by sample name and the wall time.'''
+    failures: list[tuple[str, Exception]]
+    seconds: float
+    written: int
+
+    def rate(self) -> float:
+        return self.written / max(self.seconds, 1e-9)
+
+
 class Dataset:
+    SECTIONS = ('test', 'train', 'valid')
+
     test: list[Data] = []
     train: list[Data] = []
     valid: list[Data] = []
@@ -19,70 +40,128 @@ class Dataset:
         self.classes = classes
         self.format = TaskType.from_str(config.str('task'))
         self.output = config.path('output')
+        self.seed = config.get('split_seed', 0)
         self.split = config.floats('split') 
+        self.workers = config.get('workers', 4)
+
+    def _export(self, data: Data, sections: list[str]) -> None:
+        for index, section in enumerate(sections):
+            self.write(data if index == len(sections) - 1 else data.copy(), section)
+
+    def assign(self, class_ids: np.ndarray, samples: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        '''
+        Split of every sample, as a bit mask over SECTIONS, from the class id of every
+        annotation, the index of the sample it belongs to and the sample keys. The hash of
+        each key, as a fraction of 2**64, is compared to the cumulative split ratios, so a
+        sample keeps its split whatever other samples the dataset holds. Balancing keeps
+        the same expected number of samples of every stratum, the rarest class of a sample.
+        '''
+        size = len(keys)
+        masks = np.zeros((size,), dtype=np.uint8)
+        classes, inverse, counts = np.unique(class_ids, return_inverse=True, return_counts=True)
+        print(f'Dataset distribution: {dict(zip(classes.tolist(), counts.tolist()))}')
+        if len(self.split) != 3 or not len(classes):
+            return masks
+
+        # Stratum: the rarest class of the sample
+        scores = np.full((size,), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(scores, samples, counts[inverse] * len(classes) + inverse)
+        labelled = scores != np.iinfo(np.int64).max
+        strata = np.where(labelled, scores % len(classes), 0)
+        totals = np.bincount(strata[labelled], minlength=len(classes))
+
+        # Balance: keep each sample of a stratum with the rate that leaves as many as in the rarest one
+        quotas = totals
+        if self.balance:
+            quotas = np.where(totals > 0, totals[totals > 0].min(), 0)
+            print(f'Dataset distribution after balancing: {dict(zip(classes.tolist(), quotas.tolist()))}')
+        rates = np.divide(quotas, totals, out=np.zeros((len(classes),)), where=totals > 0)[strata]
+
+        # Split: the key fraction, rescaled over the kept ones, against the cumulative ratios
+        fractions = (keys >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+        kept = np.flatnonzero(labelled & (fractions < rates))
+        sections = np.searchsorted(np.cumsum(self.split), fractions[kept] / rates[kept], side='right')
+        kept, sections = kept[sections < 3], sections[sections < 3]  # past the ratios the sample is left out
+        masks[kept] = np.left_shift(1, sections)
+        return masks
+
+    def close(self) -> None:
+        '''Finish the files written across samples, once every sample was written.'''
+        pass
+
+    def export(self, samples: Iterable[tuple[Data, list[str]]], total: int | None = None) -> ExportStats:
+        '''
+        Write (sample, sections) pairs on `workers` threads, keeping at most twice as many
+        samples in flight. A failed sample does not stop the export; it is returned in the stats.
+        '''
+        written, failures = 0, []
+        pending: deque[tuple[str, Future]] = deque()
+
+        def collect() -> None:
+            nonlocal written
+            name, future = pending.popleft()
+            try:
+                future.result()
+                written += 1
+            except Exception as e:
+                failures.append((name, e))
+            pbar.update(1)
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=max(self.workers, 1), thread_name_prefix='export') as pool:
+            with tqdm(total=total, desc='Writing', unit='sample') as pbar:
+                for data, sections in samples:
+                    pending.append((data.name, pool.submit(self._export, data, sections)))
+                    while len(pending) >= 2 * max(self.workers, 1):
+                        collect()
+                while pending:
+                    collect()
+
+        return ExportStats(failures=failures, seconds=perf_counter() - start, written=written)
 
     @abstractmethod
     def get(self) -> None:
         raise NotImplementedError
 
+    def key(self, name: str) -> int:
+        '''Stable 64-bit hash of a sample name, keyed by the split seed.'''
+        digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8, key=str(self.seed).encode('utf-8'))
+        return int.from_bytes(digest.digest(), 'little')
+
     def prepare(self, data: list[Data]) -> None:
-        counters: dict[int, int] = {}
-        for d in data:
-            for anno in d.annotations.items:
-                if not anno.class_id in counters:
-                    counters[anno.class_id] = 1
-                else:
-                    counters[anno.class_id] += 1
-        counters = dict(sorted(counters.items()))
-        print(f'Dataset distribution: {counters}')
-
-        # Balance
-        if self.balance:
-            min: int = math.inf
-            for count in counters.values():
-                if count is None:
-                    continue
-                if count < min:
-                    min = count
-
-            for class_id in counters.keys():
-                counters[class_id] = min
-
-            print(f'Dataset distribution after balancing: {counters}')
-
-        # Split
-        if len(self.split) == 3:
-            items: dict[int, list[Data]] = {}
-            for class_id in counters.keys():
-                items[class_id] = []
-
-            for d in data:
-                for anno in d.annotations.items:
-                    items[anno.class_id].append(d.copy())
-
-            for class_id, count in counters.items():
-                test = math.floor(count * self.split[0])
-                for i in range(test):
-                    if i == test:
-                        break
-                    self.test.append(items[class_id].pop())
-
-                train = math.ceil(count * self.split[1])
-                for i in range(train):
-                    if i == train:
-                        break
-                    self.train.append(items[class_id].pop())
-
-                valid = count - (test + train)
-                for i in range(valid):
-                    if i == valid:
-                        break
-                    self.valid.append(items[class_id].pop())
+        '''Split samples held in memory; `assign` and `write` build a dataset without holding them.'''
+        class_ids = [d.annotations.class_ids if d.annotations is not None else np.empty((0,), dtype=np.int64) for d in data]
+        samples = np.repeat(np.arange(len(data)), [len(ids) for ids in class_ids])
+        flat = np.concatenate(class_ids) if class_ids else np.empty((0,), dtype=np.int64)
+        keys = np.array([self.key(d.name) for d in data], dtype=np.uint64)
+
+        for d, mask in zip(data, self.assign(flat, samples, keys).tolist()):
+            for section in self.sections(mask):
+                getattr(self, section).append(d.copy())
 
-    @abstractmethod
     def save(self) -> None:
+        '''Write the metadata, then the prepared samples; raises when any of them failed.'''
+        self.save_metadata()
+        samples = [(data, [section]) for section in self.SECTIONS for data in getattr(self, section)]
+        stats = self.export(samples, total=len(samples))
+        self.close()
+        if stats.failures:
+            errors = '; '.join(f'{name}: {error}' for name, error in stats.failures)
+            raise Exception(f'Failed to write {len(stats.failures)}/{len(samples)} samples: {errors}')
+
+    @abstractmethod
+    def save_metadata(self) -> None:
         raise NotImplementedError
 
+    @staticmethod
+    def sections(mask: int) -> list[str]:
+        return [section for bit, section in enumerate(Dataset.SECTIONS) if mask & (1 << bit)]
+
     def setup(self) -> None:
         rmtree(self.output, ignore_errors=True, onexc=None)
-        self.output.mkdir(exist_ok=True, parents=True)
\ No newline at end of file
+        self.output.mkdir(exist_ok=True, parents=True)
+
+    @abstractmethod
+    def write(self, data: Data, section: str) -> None:
+        '''Write one sample into a section of SECTIONS; called from several threads at once.'''
+        raise NotImplementedError
@@ -1,24 +1,220 @@
-from dataclasses import dataclass
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Iterator
 
-from play.common import Config
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from play.common import Config, TaskType
 from play.data import Data
+from play.data.utils.storage import _encoded
 
 from .dataset import Dataset
 
 
-@dataclass
+FORMATS = {'arrow': '.arrow', 'parquet': '.parquet'}
+
+
+class Shards:
+    '''
+    Writes the rows of one split into numbered files of at most `shard_size` rows, in
+    row groups (parquet) or record batches (arrow) of `row_group_size` rows. Rows are
+    buffered under a lock; full groups are converted and written outside of it.
+    '''
+    def __init__(
+        self,
+        path: Path,
+        schema: pa.Schema,
+        compression: str | None = 'zstd',
+        format: str = 'parquet',
+        row_group_size: int = 1000,
+        shard_size: int = 10000,
+    ) -> None:
+        self.compression = compression
+        self.format = format
+        self.path = path
+        self.row_group_size = max(row_group_size, 1)
+        self.schema = schema
+        self.shard_size = max(shard_size, 1)
+
+        self.buffer: list[dict] = []
+        self.files: list[Path] = []
+        self.lock = Lock()
+        self.rows = 0  # rows in the open file
+        self.total = 0
+        self.write_lock = Lock()
+        self.writer: pq.ParquetWriter | ipc.RecordBatchFileWriter | None = None
+
+    def _open(self) -> None:
+        path = self.path.with_name(f'{self.path.name}-{len(self.files):05d}{FORMATS[self.format]}')
+        if self.format == 'arrow':
+            options = ipc.IpcWriteOptions(compression=self.compression)
+            self.writer = ipc.new_file(path, self.schema, options=options)
+        else:
+            self.writer = pq.ParquetWriter(path, self.schema, compression=self.compression or 'none')
+        self.files.append(path)
+        self.rows = 0
+
+    def _write(self, rows: list[dict]) -> None:
+        with self.write_lock:
+            while rows:
+                if self.writer is None:
+                    self._open()
+                count = min(len(rows), self.shard_size - self.rows)
+                table = pa.Table.from_pylist(rows[:count], schema=self.schema)
+                if self.format == 'arrow':
+                    self.writer.write_table(table, max_chunksize=self.row_group_size)
+                else:
+                    self.writer.write_table(table, row_group_size=self.row_group_size)
+                rows = rows[count:]
+                self.rows += count
+                self.total += count
+                if self.rows >= self.shard_size:
+                    self.writer.close()
+                    self.writer = None
+
+    def add(self, row: dict) -> None:
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) < self.row_group_size:
+                return
+            rows, self.buffer = self.buffer, []
+        self._write(rows)
+
+    def close(self) -> None:
+        with self.lock:
+            rows, self.buffer = self.buffer, []
+        self._write(rows)
+        with self.write_lock:
+            if self.writer:
+                self.writer.close()
+                self.writer = None
+
+
 class HFDataset(Dataset):
+    '''
+    Hugging Face dataset: every split is streamed into <output>/data/<split>-<n>.parquet
+    (or .arrow) shards holding the encoded image, as in the datasets Image feature, and
+    the annotations as list columns. Parquet files are read memory-mapped, and uncompressed
+    arrow files zero-copy, so a split loads without deserializing every file up front.
+    '''
     def __init__(self, config: Config) -> None:
         super().__init__(config)
+        options: dict = config.get('hugging_face') or {}
+        self.compression: str | None = options.get('compression', 'zstd')
+        if str(self.compression).lower() == 'none':
+            self.compression = None
+        self.file_format: str = options.get('format', 'parquet')
+        if self.file_format not in FORMATS:
+            raise ValueError(f'Unknown format: {self.file_format}. Expected one of {tuple(FORMATS)}')
+        self.row_group_size: int = options.get('row_group_size', 1000)
+        self.shard_size: int = options.get('shard_size', 10000)
 
-    def get(self) -> None:
-        return super().setup()
-    
-    def prepare(self, data: list[Data]) -> None:
-        super().prepare(data)
+        self.lock = Lock()
+        self.shards: dict[str, Shards] = {}
 
-    def save(self) -> None:
-        return super().setup()
+    def _row(self, data: Data) -> dict:
+        row = {
+            'image': {'bytes': _encoded(data.image), 'path': f'{data.name}{data.image.suffix}'} if data.image else None,
+            'name': data.name,
+        }
+
+        annotations = data.annotations
+        labelled = annotations.class_ids >= 0 if annotations is not None else None
+        if self.format == TaskType.CLASSIFY:
+            row['label'] = int(annotations.class_ids[labelled][0]) if labelled is not None and labelled.any() else None
+            return row
+
+        objects = {'bbox': [], 'category': [], 'orientation': [], 'points': []}
+        if labelled is not None:
+            offsets = annotations.offsets
+            for index in np.flatnonzero(labelled):
+                objects['bbox'].append(annotations.boxes[index].tolist())
+                objects['category'].append(int(annotations.class_ids[index]))
+                objects['orientation'].append(float(annotations.orientations[index]))
+                objects['points'].append(annotations.points[offsets[index]:offsets[index + 1]].tolist())
+        row['objects'] = objects
+        return row
+
+    def _save_info(self, splits: dict[str, dict]) -> None:
+        info = {
+            'classes': self.classes,
+            'features': self.schema().to_string(show_schema_metadata=False).splitlines(),
+            'format': self.file_format,
+            'splits': splits,
+        }
+        with open(self.output.joinpath('dataset_info.json'), 'w', encoding='utf-8') as file:
+            json.dump(info, file, indent=2)
+
+    def batches(self, section: str = 'train', columns: list[str] | None = None) -> Iterator[pa.RecordBatch]:
+        '''Stream the record batches of a split from the memory-mapped files, one row group at a time.'''
+        for path in self.files(section):
+            if self.file_format == 'arrow':
+                reader = ipc.open_file(pa.memory_map(str(path)))
+                for index in range(reader.num_record_batches):
+                    batch = reader.get_batch(index)
+                    yield batch.select(columns) if columns else batch
+            else:
+                yield from pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=self.row_group_size, columns=columns)
+
+    def close(self) -> None:
+        splits: dict[str, dict] = {}
+        for section, shards in self.shards.items():
+            shards.close()
+            splits[section] = {'files': [path.name for path in shards.files], 'rows': shards.total}
+        self.shards.clear()
+        self._save_info(splits)
+
+    def files(self, section: str) -> list[Path]:
+        return sorted(self.output.joinpath('data').glob(f'{section}-*{FORMATS[self.file_format]}'))
+
+    def get(self, section: str = 'train', columns: list[str] | None = None) -> pa.Table:
+        '''Table of a split backed by the memory-mapped files; arrow files are not copied at all.'''
+        tables: list[pa.Table] = []
+        for path in self.files(section):
+            if self.file_format == 'arrow':
+                table = ipc.open_file(pa.memory_map(str(path))).read_all()
+                tables.append(table.select(columns) if columns else table)
+            else:
+                tables.append(pq.read_table(path, columns=columns, memory_map=True))
+        return pa.concat_tables(tables) if tables else self.schema().empty_table()
+
+    def save_metadata(self) -> None:
+        self._save_info({})
+
+    def schema(self) -> pa.Schema:
+        fields = [
+            pa.field('image', pa.struct([pa.field('bytes', pa.binary()), pa.field('path', pa.string())])),
+            pa.field('name', pa.string()),
+        ]
+        if self.format == TaskType.CLASSIFY:
+            fields.append(pa.field('label', pa.int64()))
+        else:
+            fields.append(pa.field('objects', pa.struct([
+                pa.field('bbox', pa.list_(pa.list_(pa.float32(), 4))),
+                pa.field('category', pa.list_(pa.int64())),
+                pa.field('orientation', pa.list_(pa.float32())),
+                pa.field('points', pa.list_(pa.list_(pa.float32()))),
+            ])))
+        return pa.schema(fields)
 
     def setup(self) -> None:
-        return super().setup()
\ No newline at end of file
+        super().setup()
+        self.output.joinpath('data').mkdir(exist_ok=True, parents=True)
+
+    def write(self, data: Data, section: str) -> None:
+        row = self._row(data)
+        with self.lock:
+            if section not in self.shards:
+                self.shards[section] = Shards(
+                    compression=self.compression,
+                    format=self.file_format,
+                    path=self.output.joinpath('data', section),
+                    row_group_size=self.row_group_size,
+                    schema=self.schema(),
+                    shard_size=self.shard_size,
+                )
+        self.shards[section].add(row)
@@ -1,15 +1,44 @@
+from pathlib import Path
+from threading import Lock
+from typing import TextIO
+
 from ultralytics.utils.downloads import download
 from yaml import dump
 
 from play.common import Config, TaskType
 from play.data import Annotation, Data
+from play.utils.files import MODES, transfer
 
 from .dataset import Dataset
 
 
 class ULDataset(Dataset):
+    '''
+    Ultralytics dataset. `transfer` sets how images reach the splits: copied, linked
+    (hardlink, reflink, symlink) or, for detection-like tasks, listed by path in
+    <split>.txt files. Ultralytics finds the label of an image by replacing its
+    "images" folder with "labels", so listed samples are hardlinked into the output
+    <split>/images and <split>/labels folders; the input storage is never written to.
+    '''
     def __init__(self, config: Config) -> None:
         super().__init__(config)
+        self.lists: dict[str, TextIO] = {}
+        self.lock = Lock()
+        self.transfer: str = config.get('transfer', 'copy')
+        if self.transfer not in MODES + ('list',):
+            raise ValueError(f'Unknown transfer mode: {self.transfer}. Expected one of {MODES + ('list',)}')
+        if self.transfer == 'list' and self.format == TaskType.CLASSIFY:
+            raise ValueError('Path lists are not supported for classification datasets, use a link mode instead')
+
+    def _list(self, data: Data, section: str) -> None:
+        '''Link a sample into the output split and list its image.'''
+        self._save_other_data(data, section, 'hardlink')
+        image = self.output.joinpath(section, 'images', f'{data.name}{data.image.suffix}')
+
+        with self.lock:
+            if section not in self.lists:
+                self.lists[section] = open(self.output.joinpath(f'{section}.txt'), 'w', encoding='utf-8')
+            self.lists[section].write(f'{image.absolute()}\n')
 
     def _save_classify_data(self, data: Data, section: str) -> None:
         if not len(data.annotations.items):
@@ -21,48 +50,25 @@ class ULDataset(Dataset):
 
         data.image.name = data.name
         data.image.parent = self.output.joinpath(section, anno.class_name)
-        data.image.save()
-
-    def _save_classify(self) -> None:
-        with open(self.output.joinpath('labels.txt'), 'w') as file:
-            for class_name in self.classes:
-                file.write(f'{class_name}\n')
-
-        for data in self.test:
-            self._save_classify_data(data, 'test')
-
-        for data in self.train:
-            self._save_classify_data(data, 'train')
+        data.image.save(data.name, self.transfer)
+
+    def _save_label(self, data: Data, parent: Path, name: str, mode: str) -> None:
+        '''Link or copy the label file the annotations were read from, writing them when there is none.'''
+        annotations = data.annotations
+        source = annotations.parent.joinpath(f'{annotations.name}{annotations.suffix}') if annotations.parent else None
+        if source and source.exists():
+            transfer(source, parent.joinpath(f'{name}{annotations.suffix}'), mode)
+            return
 
-        for data in self.valid:
-            self._save_classify_data(data, 'val')
+        annotations.parent = parent
+        annotations.save(name)
 
-    def _save_other_data(self, data: Data, section: str) -> None:
-        data.annotations.name = data.name
-        data.annotations.parent = self.output.joinpath(section, 'labels')
+    def _save_other_data(self, data: Data, section: str, mode: str | None = None) -> None:
+        mode = mode or self.transfer
+        self._save_label(data, self.output.joinpath(section, 'labels'), data.name, mode)
         data.image.name = data.name
         data.image.parent = self.output.joinpath(section, 'images')
-        data.save()
-
-    def _save_other(self) -> None:
-        data = dict({
-            'names': self.classes,
-            'nc': len(self.classes),
-            'test': f'{self.output.joinpath('test').absolute()}',
-            'train': f'{self.output.joinpath('train').absolute()}',
-            'val': f'{self.output.joinpath('valid').absolute()}',
-        })
-        with open(self.output.joinpath('data.yaml'), 'w') as file:
-            dump(data, file)
-
-        for data in self.test:
-            self._save_other_data(data, 'test')
-
-        for data in self.train:
-            self._save_other_data(data, 'train')
-
-        for data in self.valid:
-            self._save_other_data(data, 'valid')
+        data.image.save(data.name, mode)
 
     def _setup_classify(self) -> None:
         for sub in ['test', 'train', 'val']:
@@ -81,17 +87,34 @@ class ULDataset(Dataset):
         for t in paths:
             self.output.joinpath(t).mkdir(exist_ok=True, parents=True)
     
+    def close(self) -> None:
+        for file in self.lists.values():
+            file.close()
+        self.lists.clear()
+
     def get(self, urls: list[str]) -> None:
         download(urls, dir=self.output)
 
     def prepare(self, data: list[Data]) -> None:
         super().prepare(data)
 
-    def save(self) -> None:
+    def save_metadata(self) -> None:
         if self.format == TaskType.CLASSIFY:
-            self._save_classify()
-        else:
-            self._save_other()
+            with open(self.output.joinpath('labels.txt'), 'w') as file:
+                for class_name in self.classes:
+                    file.write(f'{class_name}\n')
+            return
+
+        suffix = '.txt' if self.transfer == 'list' else ''
+        data = dict({
+            'names': self.classes,
+            'nc': len(self.classes),
+            'test': f'{self.output.joinpath(f'test{suffix}').absolute()}',
+            'train': f'{self.output.joinpath(f'train{suffix}').absolute()}',
+            'val': f'{self.output.joinpath(f'valid{suffix}').absolute()}',
+        })
+        with open(self.output.joinpath('data.yaml'), 'w') as file:
+            dump(data, file)
 
     def setup(self) -> None:
         super().setup()
@@ -100,3 +123,11 @@ class ULDataset(Dataset):
             self._setup_classify()
         else:
             self._setup_other()
+
+    def write(self, data: Data, section: str) -> None:
+        if self.format == TaskType.CLASSIFY:
+            self._save_classify_data(data, 'val' if section == 'valid' else section)
+        elif self.transfer == 'list':
+            self._list(data, section)
+        else:
+            self._save_other_data(data, section)
@@ -1,10 +1,20 @@
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+from functools import partial
+from pathlib import Path
+from traceback import format_exc
+from typing import Generator, Iterator
 
+import numpy as np
 from tqdm import tqdm
 
-from .common import Config, Context
-from .data import Annotations, Data
+from .common import Config, Context, Pipeline, Stage, StageError
+from .data import Annotations, Data, Encoding, LabelCache, Manifest, WriteBehind
+from .data.utils.manifest import Entry
 from .dataset import Dataset, DatasetFactory
 from .model import Model, ModelFactory
 from .data import (
@@ -40,53 +50,213 @@ class ModelEngine(Engine):
         super().__init__(context)
         self.model: Model = ModelFactory.create(self.context)
 
+# === Workers ===
+
+_processor: Processor | None = None
+
+def _init_worker(processor: Processor) -> None:
+    '''Keep one processor per worker process instead of pickling it with every sample.'''
+    global _processor
+    _processor = processor
+
+def _process_data(data: Data) -> tuple[list[Data] | None, str | None]:
+    '''Load and process data inside a worker. Returns the processed items or the failure trace.'''
+    try:
+        data.load()
+        job: Job = _processor.process(data=data)
+        return job.current, None
+    except Exception:
+        return None, format_exc()
+
+def _decode_data(data: Data) -> Data:
+    if data.image:
+        data.image.decode()
+    return data
+
+def _encode_with(encodings: dict[str | None, Encoding | None] | None, result: tuple[str, list[Data]]) -> tuple[str, list[Data]]:
+    if encodings is None:  # the storage keeps raw pixels
+        return result
+    for item in result[1]:
+        if item.image:
+            item.image.encode(encodings.get(item.output, encodings[None]))
+    return result
+
+def _process_with(processor: Processor, data: Data) -> tuple[str, list[Data]]:
+    job: Job = processor.process(data=data)
+    return data.name, job.current
+
+def _read_data(data: Data) -> Data:
+    if data.annotations is not None:
+        data.annotations.load()
+    if data.image:
+        data.image.read()
+    return data
+
+def _write_with(storage: Storage, result: tuple[str, list[Data]]) -> tuple[str, list[Data]]:
+    for item in result[1]:
+        storage.write(item)
+    return result
+
 # === Data Engines ===
 
 class DatasetEngine(DataEngine):
     def __init__(self, context: Context):
         super().__init__(context)
-        self.dataset: Dataset = DatasetFactory.create(self.config)
-        
-    def run(self) -> None:
-        self.context.logger.info(f'Loading data for dataset...')
-        with tqdm(total=self.ingestor.size()) as pbar:
+        self.dataset: Dataset = DatasetFactory.create(self.context.config)
+        self.cache: bool = self.context.config.get('label_cache', True)
+        self.labels: dict[Path, LabelCache] = {}
+
+    def _load_annotations(self, annotations: Annotations) -> None:
+        '''Load labels through the binary cache of their directory when enabled.'''
+        if not self.cache or not annotations.parent or not annotations.suffix:
+            annotations.load()
+            return
+
+        parent = Path(annotations.parent)
+        if parent not in self.labels:
+            self.labels[parent] = LabelCache(parent)
+        self.labels[parent].load(annotations)
+
+    def _save_labels(self) -> None:
+        for cache in self.labels.values():
+            try:
+                cache.save()
+            except OSError as e:
+                self.context.logger.warning(f'Failed to save label cache {cache.path}: {e}')
+                continue
+            self.context.logger.info(f'Label cache {cache.path}', hits=cache.hits, misses=cache.misses)
+
+    def _scan(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''Metadata pass: the class id of every annotation, the index of its sample and the key of every sample.'''
+        class_ids, keys, samples = array('q'), array('Q'), array('q')
+        size = 0
+        with tqdm(total=self.ingestor.size(), desc='Scanning') as pbar:
             for data in self.ingestor.load():
                 try:
-                    self.context.logger.debug(f'Loading annotations for: {data.name}')
-                    data.annotations.load()
-                    self.context.logger.debug(f'Adding data to storage for: {data.name}')
-                    self.storage.add(data)
+                    if data.annotations is not None:
+                        self.context.logger.debug(f'Loading annotations for: {data.name}')
+                        self._load_annotations(data.annotations)
+                        ids = data.annotations.class_ids
+                        class_ids.frombytes(ids.astype(np.int64).tobytes())
+                        samples.frombytes(np.full((len(ids),), size, dtype=np.int64).tobytes())
                 except Exception as e:
-                    self.context.logger.error(f'Failed to add data {data.name}: {e}')
+                    self.context.logger.error(f'Failed to scan data {data.name}: {e}')
 
-                pbar.set_description(f'{data.name}')
+                keys.append(self.dataset.key(data.name))
+                size += 1
                 pbar.update(1)
 
+        return (
+            np.frombuffer(class_ids, dtype=np.int64),
+            np.frombuffer(samples, dtype=np.int64),
+            np.frombuffer(keys, dtype=np.uint64),
+        )
+
+    def _samples(self, masks: list[int]) -> Generator[tuple[Data, list[str]], None, None]:
+        '''Second pass: the samples assigned to a split, with their labels loaded.'''
+        for index, data in enumerate(self.ingestor.load()):
+            if index >= len(masks):
+                self.context.logger.warning(f'Input changed since it was scanned, stopping at {len(masks)} samples')
+                return
+
+            sections = self.dataset.sections(masks[index])
+            if not sections:
+                continue
+            try:
+                if data.annotations is not None:
+                    self._load_annotations(data.annotations)
+            except Exception as e:
+                self.context.logger.error(f'Failed to load data {data.name}: {e}')
+                continue
+            yield data, sections
+
+    def run(self) -> None:
+        '''
+        Build the dataset in two streaming passes over the input: the first reads only the
+        labels to count classes and assign splits, the second writes each sample straight
+        into its splits. Both passes rely on the ingestor yielding samples in the same order.
+        '''
+        self.context.logger.info(f'Scanning labels for dataset...')
+        class_ids, samples, keys = self._scan()
+        self._save_labels()
+
         self.context.logger.info(f'Preparing dataset...')
+        masks = self.dataset.assign(class_ids, samples, keys).tolist()
         self.dataset.setup()
-        self.dataset.prepare(self.storage.all())
-        self.dataset.save()
-        self.context.logger.info(f'Dataset successfully created.')
+        self.dataset.save_metadata()
+
+        total = sum(1 for mask in masks if mask)
+        self.context.logger.info(f'Writing dataset...', samples=total, workers=self.dataset.workers)
+        stats = self.dataset.export(self._samples(masks), total=total)
+        for name, error in stats.failures:
+            self.context.logger.error(f'Failed to write data {name}: {type(error).__name__}: {error}')
+        self.dataset.close()
+
+        self.context.logger.info(
+            f'Exported {stats.written} samples in {stats.seconds:.1f}s ({stats.rate():.1f} samples/s)',
+            failures=len(stats.failures),
+            seconds=stats.seconds,
+            workers=self.dataset.workers,
+            written=stats.written,
+        )
+        if stats.failures:
+            self.context.logger.error(f'Dataset created with {len(stats.failures)} failed samples. Wrote {stats.written}/{total} samples.')
+        else:
+            self.context.logger.info(f'Dataset successfully created. Wrote {stats.written}/{total} samples.')
 
 class IngestEngine(DataEngine):
     def __init__(self, context: Context, batch_size: int = 100) -> None:
         super().__init__(context)
         self.batch_size = batch_size
+        self.ordered: bool = self.context.config.get('ordered', True)
+        self.pipeline: dict | None = self.context.config.get('pipeline')
+        self.workers: int = self.context.config.get('workers', 1)
         self.process: Processor = ProcessFactory.create(context)
-        self.context.logger.info(f'Engine initialization completed.', engine='ingest')
 
-    def _flush(self, batch: list[Data]) -> int:
-        '''Persist a batch of data to storage.'''
+        self.entries: dict[str, Entry | None] = {}
+        self.manifest: Manifest | None = None
+        if self.context.config.get('resume', False):
+            self.manifest = Manifest(
+                fingerprint=Manifest.fingerprint_of(self.context.config.get('process')),
+                path=self.storage.path.joinpath('manifest.sqlite'),
+            )
+            self.context.logger.info(f'Resuming from manifest with {self.manifest.size()} ingested sources')
+
+        self.writer: WriteBehind | None = None
+        write_behind: dict | None = self.context.config.get('write_behind')
+        if write_behind:
+            self.writer = WriteBehind(
+                logger=self.context.logger,
+                max_bytes=write_behind.get('max_bytes', 256 * 1024 * 1024),
+                storage=self.storage,
+                workers=write_behind.get('workers', 4),
+            )
+
+        self.context.logger.info(f'Engine initialization completed.', engine='ingest', workers=self.workers)
+
+    def _flush(self, batch: list[list[Data]], names: list[str]) -> int:
+        '''
+        Persist a batch of data to storage and record it in the manifest. With write-behind
+        the batch is handed to the writer threads, and the count is what they finished since.
+        '''
+        if self.writer:
+            self.writer.submit(list(zip(names, batch)))
+            return self._written(self.writer.completed())
+
         try:
             self.context.logger.debug('Flushing items to storage', size=len(batch))
             self.storage.add(batch)
             self.storage.save()
             self.storage.clear()
-            return len(batch)
         except Exception:
             self.context.logger.exception(f'Failed to flush batch to storage')
             return 0
-        
+
+        if self.storage.fsync:
+            self.storage.sync()
+        self._record(names)
+        return len(batch)
+
     def _handle_data(self, data: Data) -> Data:
         '''Load, process, and return data ready for storage. None on failure.'''
         try:
@@ -99,33 +269,194 @@ class IngestEngine(DataEngine):
         except Exception:
             self.context.logger.exception(f'Failed to add data {data.name}')
             return None
-        
-    def run(self) -> None:
-        self.context.logger.info('Running ingestion process.')
+
+    def _results(self, source: Iterator[Data]) -> Iterator[tuple[str, list[Data] | None]]:
+        if self.workers > 1:
+            return self._run_parallel(source)
+        return self._run_serial(source)
+
+    def _run_parallel(self, source: Iterator[Data]) -> Generator[tuple[str, list[Data] | None], None, None]:
+        '''Fan samples out to a process pool, keeping at most two in flight per worker.'''
+        window = self.workers * 2
+        pool = self._create_pool()
+        pending: deque[tuple[str, Future]] = deque()
+        try:
+            for data in source:
+                try:
+                    future = pool.submit(_process_data, data)
+                except BrokenProcessPool:
+                    self.context.logger.warning('Worker pool is broken, restarting it')
+                    pool.shutdown(cancel_futures=True)
+                    pool = self._create_pool()
+                    future = pool.submit(_process_data, data)
+
+                pending.append((data.name, future))
+                if len(pending) < window:
+                    continue
+
+                for name, future in self._collect(pending):
+                    yield self._result(name, future)
+
+            while pending:
+                for name, future in self._collect(pending):
+                    yield self._result(name, future)
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def _run_serial(self, source: Iterator[Data]) -> Generator[tuple[str, list[Data] | None], None, None]:
+        for data in source:
+            yield data.name, self._handle_data(data)
+
+    def _collect(self, pending: deque[tuple[str, Future]]) -> list[tuple[str, Future]]:
+        '''Pop the next finished futures: the oldest one when ordered, any completed ones otherwise.'''
+        if self.ordered:
+            name, future = pending.popleft()
+            future.exception()
+            return [(name, future)]
+
+        done, _ = wait([future for _, future in pending], return_when=FIRST_COMPLETED)
+        finished = [(name, future) for name, future in pending if future in done]
+        for item in finished:
+            pending.remove(item)
+        return finished
+
+    def _create_pipeline(self) -> Pipeline:
+        '''Build the read → decode → process → encode → write stages from the "pipeline" config.'''
+        def stage(name: str, fn, io: bool = False) -> Stage:
+            options: dict = self.pipeline.get(name) or {}
+            return Stage(
+                name=name,
+                fn=fn,
+                mode='thread' if io else options.get('mode', 'thread'),  # I/O stages share this process' storage
+                queue_size=options.get('queue_size', self.pipeline.get('queue_size', 8)),
+                workers=options.get('workers', 1),
+            )
+
+        return Pipeline(
+            logger=self.context.logger,
+            stages=[
+                stage('read', _read_data, io=True),
+                stage('decode', _decode_data),
+                stage('process', partial(_process_with, self.process)),
+                stage('encode', partial(_encode_with, self.storage.encodings if self.storage.encodes else None)),
+                stage('write', partial(_write_with, self.storage), io=True),
+            ],
+        )
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.process,),
+        )
+
+    def _result(self, name: str, future: Future) -> tuple[str, list[Data] | None]:
+        '''Unwrap a worker result, logging failures without stopping the run.'''
+        error = future.exception()
+        if error:
+            self.context.logger.error(f'Worker failed for data {name}: {type(error).__name__}: {error}')
+            return name, None
+
+        items, trace = future.result()
+        if trace:
+            self.context.logger.error(f'Failed to add data {name}\n{trace}')
+        return name, items
+
+    def _run_pipelined(self, source: Iterator[Data], pbar: tqdm) -> tuple[int, int]:
         persisted = 0
         seen = 0
-        total = self.ingestor.size()
-        with tqdm(total=total, desc='Ingesting') as pbar:
-            batch: list[Data] = []  
-            for data in self.ingestor.load():
-                item = self._handle_data(data)
-
-                if not item:
+        names: list[str] = []
+        pipeline = self._create_pipeline()
+        for result in pipeline.run(source):
+            if isinstance(result, StageError):
+                item = result.item
+                self.entries.pop(item.name if isinstance(item, Data) else item[0], None)
+                if result.stage == 'write':
+                    seen += 1
+                pbar.update(1)
+                continue
+
+            name, _ = result
+            names.append(name)
+            seen += 1
+            persisted += 1
+            if len(names) >= self.batch_size:
+                self._record(names)
+                names.clear()
+
+            pbar.set_description(f'{name}')
+            pbar.update(1)
+
+        self._record(names)
+        pipeline.report()
+        return seen, persisted
+
+    def _record(self, names: list[str]) -> None:
+        '''Mark the sources of persisted items as ingested in the manifest.'''
+        if not self.manifest:
+            return
+        entries = [self.entries.pop(name, None) for name in names]
+        self.manifest.record([entry for entry in entries if entry])
+
+    def _source(self, pbar: tqdm) -> Generator[Data, None, None]:
+        '''Yield the samples to ingest, skipping those the manifest reports as unchanged.'''
+        skipped = 0
+        for data in self.ingestor.load():
+            if self.manifest:
+                entry = self.manifest.entry(data)
+                if entry and self.manifest.is_current(entry):
+                    skipped += 1
                     pbar.update(1)
                     continue
+                self.entries[data.name] = entry
+            yield data
 
-                batch.append(item)
-                seen += 1
+        if self.manifest:
+            self.context.logger.info(f'Skipped {skipped} unchanged items already in the manifest.')
 
-                if len(batch) >= self.batch_size:
-                    persisted += self._flush(batch)
-                    batch.clear()
+    def _written(self, names: list[str]) -> int:
+        self._record(names)
+        return len(names)
 
-                pbar.set_description(f'{data.name}')
-                pbar.update(1)
+    def run(self) -> None:
+        self.context.logger.info('Running ingestion process.', workers=self.workers, ordered=self.ordered, pipelined=bool(self.pipeline))
+        persisted = 0
+        seen = 0
+        total = self.ingestor.size()
+        with tqdm(total=total, desc='Ingesting') as pbar:
+            if self.pipeline:
+                seen, persisted = self._run_pipelined(self._source(pbar), pbar)
+            else:
+                batch: list[Data] = []
+                names: list[str] = []
+                for name, item in self._results(self._source(pbar)):
+                    if not item:
+                        self.entries.pop(name, None)
+                        pbar.update(1)
+                        continue
+
+                    batch.append(item)
+                    names.append(name)
+                    seen += 1
+
+                    if len(batch) >= self.batch_size:
+                        persisted += self._flush(batch, names)
+                        batch.clear()
+                        names.clear()
+
+                    pbar.set_description(f'{name}')
+                    pbar.update(1)
         
-        if batch:
-            persisted += self._flush(batch)
+                if batch:
+                    persisted += self._flush(batch, names)
+                if self.writer:
+                    persisted += self._written(self.writer.close())
+                    if self.writer.failures:
+                        self.context.logger.warning(f'Write-behind failed for {self.writer.failures} items.')
+
+        self.storage.close()
+        if self.manifest:
+            self.manifest.close()
 
         self.context.logger.info(f'Data successfully ingested. Processed {seen} items, persisted {persisted}/{total} items.')
 
@@ -0,0 +1,54 @@
+import os
+from pathlib import Path
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+
+FICLONE = 0x40049409  # linux/fs.h: share the extents of a file (btrfs, xfs, ...)
+MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+
+def copy(src: Path, dst: Path) -> None:
+    shutil.copyfile(src, dst)
+
+def hardlink(src: Path, dst: Path) -> None:
+    '''Hardlink dst to src, copying when the link is not possible (e.g. across devices).'''
+    try:
+        os.link(src, dst)
+    except OSError:
+        copy(src, dst)
+
+def reflink(src: Path, dst: Path) -> None:
+    '''Copy-on-write clone of src, copying when the filesystem does not support it.'''
+    if fcntl is None:
+        return copy(src, dst)
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        copy(src, dst)
+
+def symlink(src: Path, dst: Path) -> None:
+    os.symlink(Path(src).absolute(), dst)
+
+def transfer(src: Path, dst: Path, mode: str = 'copy') -> None:
+    '''Place the bytes of src at dst, replacing it, by copy, hardlink, reflink or symlink.'''
+    if Path(src).absolute() == Path(dst).absolute():
+        return
+
+    dst.unlink(missing_ok=True)
+    match mode:
+        case 'copy':
+            copy(src, dst)
+        case 'hardlink':
+            hardlink(src, dst)
+        case 'reflink':
+            reflink(src, dst)
+        case 'symlink':
+            symlink(src, dst)
+        case _:
+            raise ValueError(f'Unknown transfer mode: {mode}. Expected one of {MODES}')
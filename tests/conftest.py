@@ -0,0 +1,56 @@
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+import pytest
+import yaml
+
+from play.common import Context
+from play.data import Annotations, Data, Image
+from play.engine import IngestEngine
+
+
+LABELS = ('0 0.5 0.5 0.4 0.3\n', '1 0.25 0.25 0.2 0.2\n2 0.7 0.6 0.3 0.4\n')
+PROCESS = {'processor': 'linear', 'processes': [{'name': 'resize', 'params': [32]}]}
+
+
+def item(name: str, suffix: str = '.png') -> Data:
+    '''In-memory sample with an 8x8 image and one box.'''
+    annotations = Annotations(name=name, parent=None, suffix='.txt')
+    annotations.loads(LABELS[0])
+    image = Image(content=np.full((8, 8, 3), 7, dtype=np.uint8), name=name, parent=None, suffix=suffix)
+    return Data(name=name, annotations=annotations, image=image)
+
+
+@pytest.fixture
+def project(tmp_path: Path) -> Path:
+    '''Parent folder of a "proj" project whose input holds four labeled jpgs.'''
+    root = tmp_path.joinpath('proj', 'in')
+    root.joinpath('images').mkdir(parents=True)
+    root.joinpath('annotations').mkdir()
+    rng = np.random.default_rng(0)
+    for index in range(4):
+        cv2.imwrite(str(root.joinpath('images', f'im{index}.jpg')), rng.integers(0, 255, (60, 80, 3), dtype=np.uint8))
+        root.joinpath('annotations', f'im{index}.txt').write_text(LABELS[index % 2])
+    return tmp_path
+
+
+@pytest.fixture
+def context(project: Path) -> Context:
+    '''Context of the project with the default ingest config.'''
+    path = project.joinpath('context.yaml')
+    path.write_text(yaml.safe_dump({'input': 'in', 'parent': str(project), 'process': PROCESS, 'project': 'proj', 'task': 'detect'}))
+    return Context(config_path=path, prefix='test')
+
+
+@pytest.fixture
+def ingest(project: Path) -> Callable[..., Path]:
+    '''Ingest the project input with config overrides, returning the storage path.'''
+    def run(**config) -> Path:
+        items = {'input': 'in', 'parent': str(project), 'process': PROCESS, 'project': 'proj', 'task': 'detect', **config}
+        path = project.joinpath('ingest.yaml')
+        path.write_text(yaml.safe_dump(items))
+        IngestEngine(Context(config_path=path, prefix='test')).run()
+        return project.joinpath('proj', 'storage')
+    return run
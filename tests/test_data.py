@@ -0,0 +1,120 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from play.data import Annotations, Encoder, Encoding, Image, LabelCache
+
+from .conftest import LABELS, item
+
+
+def annotations(text: str) -> Annotations:
+    annotations = Annotations(name='im', parent=None, suffix='.txt')
+    annotations.loads(text)
+    return annotations
+
+
+def test_copy_shares_pixels() -> None:
+    data = item('im0')
+    copy = data.copy()
+    assert copy.image.content is data.image.content
+
+    copy.image.mutable()[0, 0] = 255
+    assert copy.image.content is not data.image.content
+    assert data.image.content[0, 0].tolist() == [7, 7, 7]
+    assert copy.image.content[0, 0].tolist() == [255, 255, 255]
+
+
+def test_copy_shares_annotations() -> None:
+    data = item('im0')
+    copy = data.copy()
+    assert copy.annotations.boxes is data.annotations.boxes
+
+    copy.annotations.items[0].class_id = 2
+    copy.annotations.normalize(2, 2)
+    assert data.annotations.dumps() == LABELS[0]
+    assert copy.annotations.dumps() == '2 0.25 0.25 0.2 0.15\n'
+
+
+@pytest.mark.parametrize('text', [
+    LABELS[1],
+    '0 0.5 0.5 0.4 0.3 0.25\n',
+    '1 0.1 0.1 0.9 0.1 0.5 0.9\n0 0.5 0.5 0.2 0.2\n',
+], ids=['boxes', 'oriented', 'polygon'])
+def test_annotations_round_trip(text: str) -> None:
+    assert annotations(text).dumps() == text
+
+
+def test_annotations_background() -> None:
+    background = annotations('')
+    assert len(background) == 1 and background.class_ids.tolist() == [-1]
+    assert background.dumps() == ''
+
+
+def test_label_cache(tmp_path: Path) -> None:
+    labels = tmp_path.joinpath('labels')
+    labels.mkdir()
+    for index in range(3):
+        labels.joinpath(f'im{index}.txt').write_text(LABELS[index % 2])
+
+    cache = LabelCache(labels)
+    for index in range(3):
+        cache.load(Annotations(name=f'im{index}', parent=labels, suffix='.txt'))
+    cache.save()
+    assert (cache.hits, cache.misses) == (0, 3)
+
+    labels.joinpath('im1.txt').write_text('2 0.1 0.2 0.3 0.4\n')
+    cache = LabelCache(labels)
+    loaded = [Annotations(name=f'im{index}', parent=labels, suffix='.txt') for index in range(3)]
+    for entry in loaded:
+        cache.load(entry)
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert [entry.dumps() for entry in loaded] == [LABELS[0], '2 0.1 0.2 0.3 0.4\n', LABELS[0]]
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Path:
+    path = tmp_path.joinpath('in', 'im.jpg')
+    path.parent.mkdir()
+    cv2.imwrite(str(path), np.random.default_rng(0).integers(0, 255, (40, 60, 3), dtype=np.uint8))
+    return path
+
+
+def test_save_pristine_keeps_source_bytes(source: Path, tmp_path: Path) -> None:
+    image = Image(name='im', parent=source.parent, source=source, suffix='.jpg')
+    image.load()
+    assert image.is_pristine()
+
+    image.parent = tmp_path
+    image.save('copy')
+    assert tmp_path.joinpath('copy.jpg').read_bytes() == source.read_bytes()
+
+    image.mutable()[0, 0] = 0
+    assert not image.is_pristine()
+    image.save('edited')
+    assert tmp_path.joinpath('edited.jpg').read_bytes() != source.read_bytes()
+
+
+def test_decode_from_buffer(source: Path) -> None:
+    image = Image(buffer=source.read_bytes(), name='im', parent=None, suffix='.jpg')
+    assert image.shape() == (40, 60)
+
+    image.load()
+    assert image.buffer is None
+    assert np.array_equal(image.content, cv2.imread(str(source)))
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_encoder(source: Path, workers: int) -> None:
+    images = [Image(content=cv2.imread(str(source)), name=f'im{index}', parent=None, suffix='.jpg') for index in range(4)]
+    settings = [Encoding(quality=90), Encoding(quality=10), Encoding(format='.png'), None]
+
+    encoder = Encoder(workers=workers)
+    encoder.encode(list(zip(images, settings)))
+    encoder.close()
+
+    assert [image.suffix for image in images] == ['.jpg', '.jpg', '.png', '.jpg']
+    assert all(image.is_empty() and image.buffer for image in images)
+    assert len(images[1].buffer) < len(images[0].buffer)
+    assert np.array_equal(cv2.imdecode(np.frombuffer(images[2].buffer, np.uint8), cv2.IMREAD_UNCHANGED), cv2.imread(str(source)))
@@ -0,0 +1,148 @@
+import json
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pytest
+import yaml
+
+from play.common import Config, Context
+from play.data import Data
+from play.dataset import DatasetFactory
+from play.dataset.dataset import Dataset
+from play.engine import DatasetEngine
+
+from .conftest import LABELS
+
+
+def dataset(tmp_path, balance: bool = False, cls: type[Dataset] = Dataset) -> Dataset:
+    items = {'balance': balance, 'classes': ['a', 'b', 'c'], 'output': str(tmp_path), 'split': [0.2, 0.6, 0.2], 'task': 'detect'}
+    return cls(Config(items=items))
+
+
+def assign(dataset: Dataset, names: list[str], labels: list[int]) -> dict[str, int]:
+    keys = np.array([dataset.key(name) for name in names], dtype=np.uint64)
+    masks = dataset.assign(np.array(labels, dtype=np.int64), np.arange(len(names)), keys)
+    return dict(zip(names, masks.tolist()))
+
+
+def test_assign_stable_when_appending(tmp_path) -> None:
+    ds = dataset(tmp_path)
+    names = [f'im{index}' for index in range(3000)]
+    labels = [index % 3 for index in range(3000)]
+    before = assign(ds, names[:1000], labels[:1000])
+    after = assign(ds, names, labels)
+
+    assert all(after[name] == mask for name, mask in before.items())
+    assert all(mask in (1, 2, 4) for mask in after.values())
+    shares = np.bincount(np.log2(list(after.values())).astype(int), minlength=3) / len(after)
+    assert shares == pytest.approx([0.2, 0.6, 0.2], abs=0.03)
+
+
+def test_assign_independent_of_order(tmp_path) -> None:
+    ds = dataset(tmp_path)
+    names = [f'im{index}' for index in range(500)]
+    labels = [index % 3 for index in range(500)]
+    assert assign(ds, names, labels) == assign(ds, names[::-1], labels[::-1])
+
+
+def test_assign_balance(tmp_path) -> None:
+    ds = dataset(tmp_path, balance=True)
+    labels = [0] * 3000 + [1] * 1000
+    masks = assign(ds, [f'im{index}' for index in range(4000)], labels)
+
+    kept = np.array([bool(masks[f'im{index}']) for index in range(4000)])
+    assert kept[3000:].all()
+    assert kept[:3000].sum() == pytest.approx(1000, rel=0.1)
+
+
+class Recorder(Dataset):
+    '''Dataset keeping the written names, failing on the ones starting with "bad".'''
+    def __init__(self, config: Config) -> None:
+        super().__init__(config)
+        self.lock = Lock()
+        self.written: list[tuple[str, str]] = []
+
+    def save_metadata(self) -> None:
+        pass
+
+    def write(self, data: Data, section: str) -> None:
+        if data.name.startswith('bad'):
+            raise ValueError(f'cannot write {data.name}')
+        with self.lock:
+            self.written.append((data.name, section))
+
+
+def test_export_reports_failures(tmp_path) -> None:
+    ds = dataset(tmp_path, cls=Recorder)
+    samples = [(Data(name=name), ['train', 'valid']) for name in ('im0', 'bad0', 'im1')]
+    stats = ds.export(samples, total=3)
+
+    assert stats.written == 2
+    assert [(name, str(error)) for name, error in stats.failures] == [('bad0', 'cannot write bad0')]
+    assert sorted(ds.written) == [('im0', 'train'), ('im0', 'valid'), ('im1', 'train'), ('im1', 'valid')]
+
+
+def test_save_raises_on_failures(tmp_path) -> None:
+    ds = dataset(tmp_path, cls=Recorder)
+    ds.train = [Data(name='im0'), Data(name='bad0')]
+    with pytest.raises(Exception, match='Failed to write 1/2 samples: bad0'):
+        ds.save()
+    assert ds.written == [('im0', 'train')]
+
+
+def build(project: Path, **config) -> Path:
+    '''Build a dataset of the project input with config overrides, returning its output path.'''
+    items = {
+        'balance': False,
+        'classes': ['a', 'b', 'c'],
+        'input': 'in',
+        'output': str(project.joinpath('ds')),
+        'parent': str(project),
+        'project': 'proj',
+        'split': [0.2, 0.6, 0.2],
+        'task': 'detect',
+        **config,
+    }
+    path = project.joinpath('dataset.yaml')
+    path.write_text(yaml.safe_dump(items))
+    DatasetEngine(Context(config_path=path, prefix='test')).run()
+    return project.joinpath('ds')
+
+
+@pytest.mark.parametrize('transfer', ['copy', 'hardlink', 'list'])
+def test_build_ultralytics(project: Path, transfer: str) -> None:
+    output = build(project, framework='ultralytics', transfer=transfer)
+    source = project.joinpath('proj', 'in')
+
+    images = sorted(output.glob('*/images/*.jpg'))
+    assert sorted(path.name for path in images) == [f'im{i}.jpg' for i in range(4)]
+    for image in images:
+        label = image.parent.parent.joinpath('labels', f'{image.stem}.txt')
+        assert label.read_text() == source.joinpath('annotations', f'{image.stem}.txt').read_text()
+        assert image.read_bytes() == source.joinpath('images', image.name).read_bytes()
+        if transfer != 'copy':
+            assert image.samefile(source.joinpath('images', image.name))
+
+    config = yaml.safe_load(output.joinpath('data.yaml').read_text())
+    if transfer == 'list':
+        listed = [line for split in ('test', 'train', 'val') for line in Path(config[split]).read_text().splitlines()]
+        assert sorted(Path(line) for line in listed) == [image.absolute() for image in images]
+
+
+@pytest.mark.parametrize('format', ['arrow', 'parquet'])
+def test_build_hugging_face(project: Path, format: str) -> None:
+    options = {'compression': 'none', 'format': format, 'row_group_size': 1, 'shard_size': 2}
+    output = build(project, framework='hugging_face', hugging_face=options)
+
+    dataset = DatasetFactory.create(Config(path=project.joinpath('dataset.yaml')))
+    rows = [row for section in Dataset.SECTIONS for row in dataset.get(section).to_pylist()]
+    assert sorted(row['name'] for row in rows) == [f'im{i}' for i in range(4)]
+    for row in rows:
+        index = int(row['name'][2:])
+        assert row['image']['bytes'] == project.joinpath('proj', 'in', 'images', f'{row["name"]}.jpg').read_bytes()
+        assert row['objects']['category'] == [int(line.split()[0]) for line in LABELS[index % 2].splitlines()]
+
+    info = json.loads(output.joinpath('dataset_info.json').read_text())
+    assert sum(split['rows'] for split in info['splits'].values()) == 4
+    assert sum(batch.num_rows for section in Dataset.SECTIONS for batch in dataset.batches(section, columns=['name'])) == 4
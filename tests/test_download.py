@@ -0,0 +1,128 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Iterator
+
+import pytest
+import yaml
+
+from play.common import Context
+from play.data.ingestors.csv import CSVIngestor
+from play.data.utils import Downloader
+
+
+CONTENT = {
+    '/a/same.jpg': b'same content',
+    '/b/same.jpg': b'same content',
+    '/big/one.jpg': b'1' * 100,
+    '/big/two.jpg': b'2' * 100,
+    '/flaky/image.jpg': b'served on the second attempt',
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''Serves CONTENT by path; /flaky/ paths answer 503 on their first request.'''
+    lock = Lock()
+    requests: dict[str, int] = {}
+
+    def do_GET(self) -> None:
+        with self.lock:
+            count = self.requests[self.path] = self.requests.get(self.path, 0) + 1
+
+        body = CONTENT.get(self.path)
+        status = 404 if body is None else 503 if self.path.startswith('/flaky/') and count == 1 else 200
+        body = body if status == 200 else b''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[str]:
+    Handler.requests = {}
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def objects(path: Path) -> list[Path]:
+    return [p for p in path.joinpath('objects').rglob('*') if p.is_file()]
+
+
+def test_download_dedup(server: str, tmp_path: Path) -> None:
+    downloader = Downloader(tmp_path, backoff=0)
+    first, second = downloader.download_many([f'{server}/a/same.jpg', f'{server}/b/same.jpg'])
+    downloader.close()
+
+    assert first != second
+    assert first.name == second.name == 'same.jpg'
+    assert first.read_bytes() == second.read_bytes() == CONTENT['/a/same.jpg']
+    assert len(objects(tmp_path)) == 1
+    assert first.stat().st_ino == second.stat().st_ino == objects(tmp_path)[0].stat().st_ino
+
+
+def test_download_cached(server: str, tmp_path: Path) -> None:
+    downloader = Downloader(tmp_path, backoff=0)
+    path = downloader.download(f'{server}/a/same.jpg')
+    assert downloader.download(f'{server}/a/same.jpg') == path
+    assert downloader.fetch(f'{server}/a/same.jpg') == CONTENT['/a/same.jpg']
+    downloader.close()
+
+    assert Handler.requests['/a/same.jpg'] == 1
+
+
+def test_download_retry(server: str, tmp_path: Path) -> None:
+    downloader = Downloader(tmp_path, backoff=0, retries=1)
+    path = downloader.download(f'{server}/flaky/image.jpg')
+    downloader.close()
+
+    assert path.read_bytes() == CONTENT['/flaky/image.jpg']
+    assert Handler.requests['/flaky/image.jpg'] == 2
+
+
+def test_download_retry_exhausted(server: str, tmp_path: Path) -> None:
+    downloader = Downloader(tmp_path, backoff=0, retries=0)
+    with pytest.raises(Exception, match='503'):
+        downloader.download(f'{server}/flaky/image.jpg')
+    downloader.close()
+
+
+def test_download_evict(server: str, tmp_path: Path) -> None:
+    downloader = Downloader(tmp_path, backoff=0, max_bytes=150)
+    one = downloader.download(f'{server}/big/one.jpg')
+    two = downloader.download(f'{server}/big/two.jpg')
+
+    assert not one.exists()
+    assert two.read_bytes() == CONTENT['/big/two.jpg']
+    assert len(objects(tmp_path)) == 1
+
+    assert downloader.download(f'{server}/big/one.jpg').read_bytes() == CONTENT['/big/one.jpg']
+    downloader.close()
+
+    assert not two.exists()
+    assert Handler.requests['/big/one.jpg'] == 2
+
+
+@pytest.mark.parametrize('prefetch_bytes', [0, 1000], ids=['over_budget', 'within_budget'])
+def test_csv_prefetch_in_order(server: str, tmp_path: Path, prefetch_bytes: int) -> None:
+    paths = ['/big/one.jpg', '/a/same.jpg', '/flaky/image.jpg', '/big/two.jpg']
+    csv = tmp_path.joinpath('in.csv')
+    csv.write_text('\n'.join(['images', *(f'{server}{path}' for path in paths)]) + '\n')
+    config = tmp_path.joinpath('ingest.yaml')
+    config.write_text(yaml.safe_dump({'download': {'in_memory': True, 'prefetch': 2, 'prefetch_bytes': prefetch_bytes}, 'task': 'detect'}))
+
+    downloader = Downloader(tmp_path.joinpath('cache'), backoff=0, retries=1)
+    ingestor = CSVIngestor(context=Context(config_path=config, prefix='test'), downloader=downloader, path=csv)
+    samples = list(ingestor.load())
+    downloader.close()
+
+    assert [data.image.buffer for data in samples] == [CONTENT[path] for path in paths]
+    assert [data.name for data in samples] == ['one', 'same', 'image', 'two']
+    assert ingestor.buffered == 0 and not ingestor.sizes
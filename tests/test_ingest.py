@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import pytest
+
+from play.common import Context
+from play.data import StorageFactory
+
+from .conftest import LABELS
+
+
+@pytest.mark.parametrize('config', [
+    {},
+    {'workers': 2},
+    {'ordered': False, 'workers': 2},
+    {'pipeline': {'queue_size': 4}},
+    {'write_behind': {'workers': 2}},
+    {'process': {'fuse': False, 'processor': 'linear', 'processes': [{'name': 'resize', 'params': [32]}]}},
+], ids=['serial', 'pool', 'unordered', 'pipeline', 'write_behind', 'unfused'])
+def test_ingest_writes_labels(ingest: Callable[..., Path], config: dict) -> None:
+    storage = ingest(**config)
+    for index in range(4):
+        assert storage.joinpath('annotations', f'im{index}.txt').read_text() == LABELS[index % 2]
+        image = cv2.imread(str(storage.joinpath('images', f'im{index}.jpg')))
+        assert max(image.shape[:2]) == 32
+
+
+@pytest.mark.parametrize('backend', ['packed', 'shard', 'sqlite'])
+def test_ingest_backend_round_trip(ingest: Callable[..., Path], project: Path, backend: str) -> None:
+    ingest(storage={'backend': backend})
+
+    storage = StorageFactory.create(Context(config_path=project.joinpath('ingest.yaml'), prefix='test'))
+    for index in range(4):
+        data = storage.get(f'im{index}')
+        assert data.annotations.dumps() == LABELS[index % 2]
+        data.image.load()
+        assert max(data.image.content.shape[:2]) == 32
+    storage.close()
+
+
+@pytest.mark.parametrize('transfer', ['copy', 'hardlink'])
+def test_ingest_passes_untouched_images(ingest: Callable[..., Path], project: Path, transfer: str) -> None:
+    storage = ingest(process={'processor': 'linear', 'processes': [{'name': 'rename'}]}, storage={'transfer': transfer})
+    sources = {path.read_bytes(): path for path in project.joinpath('proj', 'in', 'images').glob('*.jpg')}
+    images = list(storage.joinpath('images').glob('*.jpg'))
+    assert sorted(sources[image.read_bytes()].name for image in images) == [f'im{i}.jpg' for i in range(4)]
+    assert all(image.samefile(sources[image.read_bytes()]) == (transfer == 'hardlink') for image in images)
+
+
+def test_ingest_pool_keeps_order(ingest: Callable[..., Path]) -> None:
+    storage = ingest(ordered=True, storage={'backend': 'packed'}, workers=2)
+    lines = storage.joinpath('packed.jsonl').read_text().splitlines()
+    assert [json.loads(line)['key'] for line in lines] == [f'im{i}' for i in range(4)]
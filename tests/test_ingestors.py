@@ -0,0 +1,57 @@
+import json
+from pathlib import Path
+
+import yaml
+
+from play.common import Context
+from play.data import IngestorFactory
+from play.data.ingestors.index import DirIndex
+
+from .conftest import LABELS, PROCESS
+
+
+def test_dir_index_rescans_changed(project: Path) -> None:
+    root = project.joinpath('proj', 'in')
+    index = DirIndex(root)
+    index.refresh(folders=('annotations', 'images'))
+    assert (index.scanned, index.changed) == (2, 2)
+    assert sorted(path.name for path in index.files('images', ('.jpg',))) == [f'im{i}.jpg' for i in range(4)]
+
+    root.joinpath('images', 'im4.jpg').write_bytes(root.joinpath('images', 'im0.jpg').read_bytes())
+    index = DirIndex(root)
+    index.refresh(folders=('annotations', 'images'))
+    assert (index.scanned, index.changed) == (2, 1)
+    assert len(index.files('images')) == 5
+
+
+def csv_context(project: Path, rows: list[str], **config) -> Context:
+    path = project.joinpath('proj', 'in.csv')
+    path.write_text('\n'.join(['images,annotations', *rows]) + '\n')
+    items = {
+        'download': {'cache': str(project.joinpath('cache'))},
+        'input': 'in.csv',
+        'parent': str(project),
+        'process': PROCESS,
+        'project': 'proj',
+        'task': 'detect',
+        **config,
+    }
+    config_path = project.joinpath('ingest.yaml')
+    config_path.write_text(yaml.safe_dump(items))
+    return Context(config_path=config_path, prefix='test')
+
+
+def test_csv_streams_chunks(project: Path) -> None:
+    root = project.joinpath('proj', 'in')
+    rows = [f'{root}/images/im{i}.jpg,{root}/annotations/im{i}.txt' for i in range(4)]
+    ingestor = IngestorFactory.create(csv_context(project, rows, chunk_size=3))
+
+    samples = list(ingestor.load())
+    assert [data.name for data in samples] == [f'im{i}' for i in range(4)]
+    for index, data in enumerate(samples):
+        data.load()
+        assert data.annotations.dumps() == LABELS[index % 2]
+
+    assert ingestor.size() == 4
+    meta = json.loads(project.joinpath('proj', 'in.csv.meta.json').read_text())
+    assert meta['rows'] == 4
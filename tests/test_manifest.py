@@ -0,0 +1,38 @@
+import os
+from pathlib import Path
+import sqlite3
+from typing import Callable
+
+
+def test_resume_skips_unchanged(ingest: Callable[..., Path]) -> None:
+    storage = ingest(resume=True)
+    storage.joinpath('images', 'im1.jpg').unlink()
+
+    ingest(resume=True)
+    assert not storage.joinpath('images', 'im1.jpg').exists()
+
+
+def test_resume_edited_label(ingest: Callable[..., Path], project: Path) -> None:
+    storage = ingest(resume=True)
+    storage.joinpath('images', 'im1.jpg').unlink()
+    project.joinpath('proj', 'in', 'annotations', 'im0.txt').write_text('2 0.1 0.2 0.3 0.4\n')
+
+    ingest(resume=True)
+    assert storage.joinpath('annotations', 'im0.txt').read_text() == '2 0.1 0.2 0.3 0.4\n'
+    assert not storage.joinpath('images', 'im1.jpg').exists()
+
+
+def test_resume_touched_source(ingest: Callable[..., Path], project: Path) -> None:
+    storage = ingest(resume=True)
+    storage.joinpath('images', 'im0.jpg').unlink()
+    image = project.joinpath('proj', 'in', 'images', 'im0.jpg')
+    os.utime(image, ns=(image.stat().st_atime_ns, image.stat().st_mtime_ns + 10**9))
+
+    ingest(resume=True)
+    assert not storage.joinpath('images', 'im0.jpg').exists()
+
+    conn = sqlite3.connect(storage.joinpath('manifest.sqlite'))
+    mtime = conn.execute('SELECT mtime FROM entries WHERE source = ?', (str(image),)).fetchone()[0]
+    conn.close()
+    label = project.joinpath('proj', 'in', 'annotations', 'im0.txt')
+    assert mtime == max(image.stat().st_mtime_ns, label.stat().st_mtime_ns)
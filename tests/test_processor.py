@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from play.data import Annotations, Data, Image
+from play.data.processor.factory import DAGProcessor, FusedProcessor, LinearProcessor, Node
+from play.data.processor.process import CropProcess, MaskProcess, Process, RenameProcess, ResizeProcess
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> Data:
+    '''Sample with a smooth 1000x800 jpg and no labels.'''
+    path = tmp_path.joinpath('src.jpg')
+    y, x = np.mgrid[0:800, 0:1000]
+    cv2.imwrite(str(path), np.dstack([x * 255 // 1000, y * 255 // 800, (x + y) * 255 // 1800]).astype(np.uint8))
+    return Data(name='src', image=Image(name='src', parent=tmp_path, source=path, suffix='.jpg'))
+
+
+@pytest.fixture
+def reads(monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    '''Flags of every cv2.imread call.'''
+    flags: list[int] = []
+    imread = cv2.imread
+
+    def counted(path, flag=cv2.IMREAD_COLOR):
+        flags.append(flag)
+        return imread(path, flag)
+
+    monkeypatch.setattr(cv2, 'imread', counted)
+    return flags
+
+
+def test_dag_decodes_source_once(source: Data, reads: list[int]) -> None:
+    processor = DAGProcessor(nodes=[
+        Node(id='small', input='source', output='small', process=ResizeProcess([128])),
+        Node(id='large', input='source', output='large', process=ResizeProcess([320])),
+    ])
+    outputs = {data.output: data.image.content.shape for data in processor.process(source).current}
+
+    assert outputs == {'large': (256, 320, 3), 'small': (128, 128, 3)}
+    assert len(reads) == 1
+    assert reads[0] & ~cv2.IMREAD_IGNORE_ORIENTATION == cv2.IMREAD_REDUCED_COLOR_2  # 500x400 covers 320x256
+
+
+def test_dag_keeps_untouched_sink(source: Data, reads: list[int]) -> None:
+    processor = DAGProcessor(nodes=[
+        Node(id='copy', input='source', output='copy', process=RenameProcess()),
+        Node(id='small', input='source', output='small', process=ResizeProcess([128])),
+    ])
+    outputs = {data.output: data for data in processor.process(source).current}
+
+    assert len(reads) == 1 and reads[0] == cv2.IMREAD_UNCHANGED
+    assert outputs['copy'].image.is_pristine()
+    assert outputs['small'].image.content.shape == (128, 128, 3)
+
+
+def sample(path: Path, labels: str | None) -> Data:
+    annotations = None
+    if labels is not None:
+        annotations = Annotations(name=path.stem, parent=None, suffix='.txt')
+        annotations.loads(labels)
+    return Data(name=path.stem, annotations=annotations, image=Image(name=path.stem, parent=path.parent, source=path, suffix='.jpg'))
+
+
+@pytest.mark.parametrize('processes', [
+    [CropProcess()],
+    [CropProcess(), ResizeProcess([64])],
+    [MaskProcess()],
+    [RenameProcess(), ResizeProcess([64])],
+], ids=['crop', 'crop_resize', 'mask', 'rename_resize'])
+@pytest.mark.parametrize('labels', [
+    '0 0.5 0.5 0.4 0.3\n1 0.25 0.3 0.2 0.2\n',
+    '0 0.1 0.1 0.9 0.1 0.5 0.9\n',
+    '',
+    None,
+], ids=['boxes', 'polygon', 'background', 'unlabeled'])
+def test_fused_matches_linear(source: Data, processes: list[Process], labels: str | None) -> None:
+    path = source.image.source
+    linear = LinearProcessor(processes=processes).process(sample(path, labels)).current
+    fused = FusedProcessor(processes=processes).process(sample(path, labels)).current
+
+    assert len(fused) == len(linear)
+    for expected, output in zip(linear, fused):
+        expected.image.load()
+        output.image.load()
+        assert np.abs(np.subtract(expected.image.content.shape, output.image.content.shape)).max() <= 1
+        if expected.image.content.shape == output.image.content.shape:
+            assert np.abs(expected.image.content.astype(int) - output.image.content).mean() < 2
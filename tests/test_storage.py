@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sqlite3
+
+import numpy as np
+import pytest
+
+from play.common import Context
+from play.data import PackedStorage, SQLiteStorage
+
+from .conftest import LABELS, item
+
+
+def test_sqlite_close_readers(context: Context, tmp_path: Path) -> None:
+    storage = SQLiteStorage(context, tmp_path.joinpath('db'))
+    storage.write(item('im0'))
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        assert all(pool.map(lambda _: storage.get('im0') is not None, range(6)))
+
+    readers = list(storage.readers)
+    assert readers
+    storage.close()
+    for reader in readers:
+        with pytest.raises(sqlite3.ProgrammingError):
+            reader.execute('SELECT 1')
+
+
+def test_packed_keeps_dtype(context: Context, tmp_path: Path) -> None:
+    deep = item('deep')
+    deep.image.content = np.arange(48, dtype=np.uint16).reshape(4, 4, 3) * 1000
+    storage = PackedStorage(context, tmp_path.joinpath('packed'))
+    storage.write(item('im0'))
+    storage.write(deep)
+    storage.close()
+
+    storage = PackedStorage(context, tmp_path.joinpath('packed'))
+    assert storage.get('im0').image.content.tolist() == item('im0').image.content.tolist()
+    data = storage.get('deep')
+    assert data.image.content.dtype == np.uint16
+    assert np.array_equal(data.image.content, deep.image.content)
+    assert data.annotations.dumps() == LABELS[0]
+    with pytest.raises(ValueError):
+        data.image.content[0, 0] = 0
+    storage.close()
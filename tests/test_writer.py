@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from play.common import Context
+from play.data import SQLiteStorage, WriteBehind
+
+from .conftest import LABELS, item
+
+
+def test_write_behind_one_transaction(context: Context, tmp_path: Path) -> None:
+    storage = SQLiteStorage(context, tmp_path.joinpath('db'))
+    statements: list[str] = []
+    storage.conn.set_trace_callback(statements.append)
+
+    writer = WriteBehind(logger=context.logger, storage=storage, workers=1)
+    writer.submit([(f'im{index}', [item(f'im{index}')]) for index in range(3)])
+    assert writer.close() == ['im0', 'im1', 'im2']
+
+    assert statements.count('BEGIN ') == 1
+    for index in range(3):
+        data = storage.get(f'im{index}')
+        assert data.annotations.dumps() == LABELS[0]
+        data.image.load()
+        assert data.image.content.shape == (8, 8, 3)
+    storage.close()
+
+
+def test_write_behind_isolates_failures(context: Context, tmp_path: Path) -> None:
+    storage = SQLiteStorage(context, tmp_path.joinpath('db'))
+    writer = WriteBehind(logger=context.logger, storage=storage, workers=1)
+    writer.submit([('good', [item('good')]), ('bad', [item('bad', '.unknown')])])
+
+    assert writer.close() == ['good']
+    assert writer.failures == 1
+    assert storage.get('good') is not None and storage.get('bad') is None
+    storage.close()